@@ -0,0 +1,124 @@
+"""Local stand-in for the Telegram Bot API, for benchmarks.
+
+Answers the handful of methods the bot uses with plausible results and
+counts every call, so the app can run at full speed without a network or
+a real token:
+
+    api = FakeBotApi(latency=0.02)
+    base_url = await api.start()          # pass to ApplicationBuilder.base_url
+    ...
+    print(api.calls)                      # Counter of method -> calls
+
+Updates passed to queue_update() are handed out by getUpdates, so the
+polling path can be driven too.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "BenchBot", "username": "bench_bot"}
+
+
+class FakeBotApi:
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.messages = {}      # (chat_id, message_id) -> current text
+        self.answers = {}       # callback_query_id -> notice shown to the user
+        self.last_call = 0.0
+        self._message_ids = itertools.count(1000)
+        self._updates = []
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def queue_update(self, update: dict):
+        self._updates.append(update)
+
+    async def idle(self, quiet: float = 0.5, timeout: float = 120):
+        """Wait until no call has arrived for `quiet` seconds."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and time.monotonic() - self.last_call < quiet:
+            await asyncio.sleep(quiet / 5)
+
+    # ---------- HTTP ----------
+    async def _handle(self, reader, writer):
+        # Keep-alive loop: httpx reuses connections.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                method = path.rsplit("/", 1)[-1]
+                payload = json.dumps(await self._call(method, self._params(body))).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(payload) + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass    # client went away, or stop() while a long poll was pending
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _params(body):
+        # PTB posts form fields whose values are JSON-encoded.
+        params = {}
+        for key, value in parse_qsl(body.decode()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    # ---------- methods ----------
+    async def _call(self, method, params):
+        self.calls[method] += 1
+        self.last_call = time.monotonic()
+        if method == "getUpdates":
+            if self._updates:
+                updates, self._updates = self._updates, []
+                return {"ok": True, "result": updates}
+            await asyncio.sleep(min(params.get("timeout", 0), 1))
+            return {"ok": True, "result": []}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method in ("sendMessage", "editMessageText"):
+            message_id = params.get("message_id") or next(self._message_ids)
+            chat_id = int(params.get("chat_id", 0))
+            self.messages[chat_id, message_id] = params.get("text", "")
+            return {"ok": True, "result": {
+                "message_id": message_id, "date": int(time.time()), "from": BOT_USER,
+                "chat": {"id": chat_id, "type": "group" if chat_id < 0 else "private"},
+                "text": params.get("text", ""),
+            }}
+        if method == "answerCallbackQuery":
+            self.answers[str(params.get("callback_query_id"))] = params.get("text")
+        if method == "getChatMember":
+            return {"ok": True, "result": {
+                "status": "creator", "is_anonymous": False,
+                "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "Admin"},
+            }}
+        return {"ok": True, "result": True}
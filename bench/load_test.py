@@ -0,0 +1,306 @@
+"""Load test of the signup flow against a local fake Bot API.
+
+Runs the real Application from bot.py, feeds it a synthetic storm of
+signup-button taps spread over many users and groups, and prints a JSON
+report (throughput, handler latency percentiles, DB time, outbound calls)
+that can be diffed across commits:
+
+    python bench/load_test.py --groups 50 --users 20 --taps 5000 > before.json
+
+By default the gateway runs with its production rate limits, so the
+outbound call counts show how much edit coalescing saves; pass
+--unthrottled to measure raw handler throughput instead. --concurrency
+sets how many updates the Application processes at once (1 = the old
+sequential behaviour). --posts N first posts N signup messages in every
+group and spreads the taps over them; each tap then updates all N.
+
+After the storm the report checks every signup message: `stale_messages`
+counts those whose final text on the fake API differs from the roster in
+the database, and the run exits non-zero if there are any. With
+--capacity N every study day takes at most N people, and
+`overbooked_days` counts the days that ended up with more, which also
+fails the run; `refused_latency` times the taps turned away because their
+day was full.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+ACTIONS = (
+    ["signup_Monday", "signup_Tuesday", "signup_Wednesday", "signup_Thursday",
+     "signup_Unavailable"] * 4
+    + ["cancel_signup"]
+)
+
+
+# -------------------- TRAFFIC --------------------
+def group_chat_id(index: int) -> int:
+    return -1001000000000 - index
+
+
+def callback_update(update_id, chat_id, user_id, data, message_id=1):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id, "date": 0, "text": "signup",
+                "chat": {"id": chat_id, "type": "supergroup", "title": "Study"},
+            },
+        },
+    }
+
+
+def callback_storm(groups: int, users: int, taps: int, seed: int = 0, actions=ACTIONS,
+                   messages=None):
+    """Yield `taps` callback updates from `users` members in each of `groups` groups.
+
+    `messages` maps a group's chat_id to the signup messages to tap on;
+    by default every tap hits message 1.
+    """
+    rng = random.Random(seed)
+    for update_id in range(1, taps + 1):
+        group = rng.randrange(groups)
+        chat_id = group_chat_id(group)
+        user_id = group * users + rng.randrange(users) + 1
+        message_id = rng.choice(messages[chat_id]) if messages else 1
+        yield callback_update(update_id, chat_id, user_id, rng.choice(actions), message_id)
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    samples = sorted(samples)
+
+    def pick(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000, 3),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3)}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -------------------- HARNESS --------------------
+async def start_bot(api, db_path, unthrottled=False, concurrency=None, capacity=None):
+    """Import bot.py configured against `api` and start its Application."""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:bench",
+        "BOT_MODE": "webhook",          # no Updater: we feed update_queue directly
+        "BOT_API_URL": await api.start(),
+        "DB_PATH": db_path,
+        "GROUP_CHAT_ID": "0",
+    })
+    if concurrency:
+        os.environ["CONCURRENT_UPDATES"] = str(concurrency)
+    if capacity:
+        os.environ["DAY_CAPACITY"] = str(capacity)
+    if unthrottled:
+        os.environ.update({"API_GLOBAL_RATE": "1000000", "API_CHAT_RATE": "1000000",
+                           "API_CHAT_BURST": "1000000"})
+    import bot
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    app = bot.build_application()
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    return bot, app
+
+
+async def stop_bot(app):
+    await app.stop()
+    await app.shutdown()
+    await app.post_shutdown(app)
+
+
+class Probe:
+    """Times every processed update and every storage call."""
+
+    def __init__(self, bot, app, expected):
+        self.handler = []
+        self.by_update = {}         # update_id -> handler latency
+        self.end_to_end = []
+        self.db_time = 0.0
+        self.db_calls = 0
+        self.enqueued = {}
+        self.expected = expected
+        self.done = asyncio.Event()
+
+        process_update = app.process_update
+
+        async def timed_process(update):
+            start = time.perf_counter()
+            try:
+                await process_update(update)
+            finally:
+                end = time.perf_counter()
+                self.handler.append(end - start)
+                self.by_update[update.update_id] = end - start
+                self.end_to_end.append(end - self.enqueued.pop(update.update_id, start))
+                if len(self.handler) >= self.expected:
+                    self.done.set()
+
+        app.process_update = timed_process
+
+        storage_run = bot.storage.run
+
+        async def timed_run(fn, *args):
+            start = time.perf_counter()
+            try:
+                return await storage_run(fn, *args)
+            finally:
+                self.db_time += time.perf_counter() - start
+                self.db_calls += 1
+
+        bot.storage.run = timed_run
+
+
+async def stale_messages(bot, api):
+    """Messages whose last text isn't the current roster."""
+    bot.rosters.invalidate()        # compare against the DB, not the cache
+    stale = 0
+    for (chat_id, _), text in api.messages.items():
+        if not text.startswith(await bot.get_signup_table(chat_id)):
+            stale += 1
+    return stale
+
+
+async def overbooked_days(bot, capacity):
+    from roster import DAY_BITS, STUDY_MASK
+
+    if not capacity:
+        return 0
+    counts = ", ".join(f"SUM((days & {bit}) != 0)" for bit in DAY_BITS.values()
+                       if bit & STUDY_MASK)
+    rows = await bot.storage.fetchall(
+        f"SELECT {counts} FROM signups GROUP BY chat_id, week_start")
+    return sum(count > capacity for row in rows for count in row)
+
+
+async def feed(app, probe, updates, rate):
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    for i, update in enumerate(updates):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        probe.enqueued[update.update_id] = time.perf_counter()
+        await app.update_queue.put(update)
+
+
+async def run(args):
+    from telegram import Update
+
+    api = FakeBotApi(latency=args.api_latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot, app = await start_bot(api, os.path.join(tmp, "bench.db"), args.unthrottled,
+                                   args.concurrency, args.capacity)
+        messages = None
+        if args.posts:
+            await bot.ready()
+            for group in range(args.groups):
+                for _ in range(args.posts):
+                    await bot.send_signup(None, group_chat_id(group))
+            messages = {group_chat_id(group): list(bot.get_roster(group_chat_id(group)).messages)
+                        for group in range(args.groups)}
+        updates = [Update.de_json(data, app.bot)
+                   for data in callback_storm(args.groups, args.users, args.taps, args.seed,
+                                              messages=messages)]
+        probe = Probe(bot, app, len(updates))
+        api.calls.clear()
+
+        start = time.perf_counter()
+        await feed(app, probe, updates, args.rate)
+        await probe.done.wait()
+        handled = time.perf_counter() - start
+        while bot.gateway.pending():     # throttled edits can trail the storm by seconds
+            await asyncio.sleep(0.05)
+        await api.idle()
+        drained = api.last_call - start if api.last_call else 0.0
+        stale = await stale_messages(bot, api)
+        overbooked = await overbooked_days(bot, args.capacity)
+
+        await stop_bot(app)
+        await api.stop()
+
+    return {
+        "bench": "load_test",
+        "commit": git_commit(),
+        "params": vars(args),
+        "updates": len(updates),
+        "elapsed_s": round(handled, 3),
+        "throughput_per_s": round(len(updates) / handled, 1),
+        "handler_latency": percentiles(probe.handler),
+        "end_to_end_latency": percentiles(probe.end_to_end),
+        # Taps on a day that was already full: answered without the message lock.
+        "refused_latency": percentiles([
+            latency for update_id, latency in probe.by_update.items()
+            if (api.answers.get(str(update_id)) or "").startswith("Sorry")]),
+        "db": {"calls": probe.db_calls, "total_s": round(probe.db_time, 3),
+               "mean_ms": round(probe.db_time / max(probe.db_calls, 1) * 1000, 3)},
+        "outbound": {"calls": dict(api.calls), "drained_after_s": round(drained, 3)},
+        "messages": len(api.messages),
+        "stale_messages": stale,
+        "overbooked_days": overbooked,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users", type=int, default=15, help="members per group")
+    parser.add_argument("--taps", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0, help="taps/sec, 0 = as fast as possible")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="fake API latency (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--posts", type=int, default=0,
+                        help="signup messages to post per group before the storm")
+    parser.add_argument("--capacity", type=int, default=0, help="DAY_CAPACITY for the run")
+    parser.add_argument("--concurrency", type=int, help="CONCURRENT_UPDATES for the run")
+    parser.add_argument("--unthrottled", action="store_true",
+                        help="lift the gateway's rate limits")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    report = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    # Doubles as a regression check: a wrong final render or a day over
+    # capacity fails the run.
+    failures = [f"{result[key]} {key.replace('_', ' ')}"
+                for key in ("stale_messages", "overbooked_days") if result[key]]
+    if failures:
+        sys.exit(f"FAIL: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
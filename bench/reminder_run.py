@@ -0,0 +1,132 @@
+"""Benchmark of the unfilled-days reminder run over many groups.
+
+Creates a database with `--groups` groups spread over a few timezones,
+signs a random subset of their members up for this week, makes every
+group's reminder due now, and times two ReminderEngine runs against the
+fake Bot API: the first sends the reminders, the second finds nothing left
+to do. The JSON report carries run times, queries issued, reminders sent
+and the process's peak RSS:
+
+    python bench/reminder_run.py --groups 10000 --chunk 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pytz
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+from load_test import git_commit, group_chat_id  # noqa: E402
+
+TIMEZONES = ["America/New_York", "America/Los_Angeles", "Europe/London", "Asia/Manila"]
+
+
+def populate(path, groups, users, fill, seed):
+    from roster import STUDY_MASK
+    from scheduler import WEEKDAYS
+    from schema import migrate, week_start_for
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    migrate(conn, 0, "2000-01-03")
+    group_rows, signup_rows = [], []
+    for i in range(groups):
+        chat_id, tz = group_chat_id(i), rng.choice(TIMEZONES)
+        local = datetime.now(pytz.timezone(tz))
+        # Due since local midnight today, i.e. right now.
+        remind_at = f"{WEEKDAYS[local.weekday()]} 00:00"
+        group_rows.append((chat_id, tz, "fri 12:00", "sun 21:00", 0.0, remind_at))
+        week = week_start_for(local)
+        for user_id in range(users):
+            if rng.random() < fill:
+                days = rng.randint(1, STUDY_MASK)       # any non-empty set of study days
+                signup_rows.append((chat_id, week, user_id, f"User{user_id}", days))
+    conn.executemany("INSERT INTO groups (chat_id, timezone, signup_at, summary_at, created_at, "
+                     "remind_at) VALUES (?, ?, ?, ?, ?, ?)", group_rows)
+    conn.executemany("INSERT INTO signups VALUES (?, ?, ?, ?, ?)", signup_rows)
+    conn.commit()
+    conn.close()
+
+
+async def run(args):
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from gateway import ApiGateway
+    from reminders import ReminderEngine
+    from storage import Storage
+
+    api = FakeBotApi()
+    bot = Bot("123456:bench", base_url=await api.start(),
+              request=HTTPXRequest(connection_pool_size=64, pool_timeout=10))
+    await bot.initialize()
+    gateway = ApiGateway(global_rate=1e6, global_burst=1e6, chat_rate=1e6, chat_burst=1e6)
+    gateway.start(bot)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        populate(path, args.groups, args.users, args.fill, args.seed)
+        storage = Storage(path)
+        engine = ReminderEngine(storage, gateway, chunk=args.chunk)
+
+        queries = 0
+        fetchall = storage.fetchall
+
+        async def counted(sql, params=()):
+            nonlocal queries
+            queries += 1
+            return await fetchall(sql, params)
+
+        storage.fetchall = counted
+        await storage.open()
+
+        start = time.perf_counter()
+        sent = await engine.run_once()
+        first = time.perf_counter() - start
+        first_queries, queries = queries, 0
+
+        start = time.perf_counter()
+        resent = await engine.run_once()
+        second = time.perf_counter() - start
+
+        await storage.close()
+    await gateway.stop()
+    await bot.shutdown()
+    await api.stop()
+
+    return {
+        "bench": "reminders",
+        "commit": git_commit(),
+        "params": vars(args),
+        "first_run": {"seconds": round(first, 3), "queries": first_queries, "sent": sent},
+        "second_run": {"seconds": round(second, 3), "queries": queries, "sent": resent},
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "outbound": dict(api.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=8, help="members per group")
+    parser.add_argument("--fill", type=float, default=0.3,
+                        help="chance a member has signed up this week")
+    parser.add_argument("--chunk", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Replay recorded update traffic against the current build.
+
+Recordings come from running the bot with RECORD_UPDATES set (see
+recorder.py). `run` feeds one, in order, into the real Application from
+bot.py against the local fake Bot API, at the recorded pace scaled by
+--speed (0 = as fast as possible), and writes a JSON report of handler
+latency per update kind and of the outbound API calls. `compare` diffs two
+reports, e.g. from two checkouts:
+
+    git checkout v1 && python bench/replay.py run friday.jsonl* --speed 10 --out v1.json
+    git checkout v2 && python bench/replay.py run friday.jsonl* --speed 10 --out v2.json
+    python bench/replay.py compare v1.json v2.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+from load_test import Probe, git_commit, percentiles, start_bot, stop_bot  # noqa: E402
+from recorder import read_recording  # noqa: E402
+
+
+def update_kind(data: dict) -> str:
+    if "callback_query" in data:
+        return "callback:" + data["callback_query"].get("data", "").split("_")[0]
+    text = (data.get("message") or {}).get("text", "")
+    if text.startswith("/"):
+        return "command:" + text.split()[0].split("@")[0]
+    return next((key for key in data if key != "update_id"), "unknown")
+
+
+# -------------------- RUN --------------------
+async def replay(args):
+    from telegram import Update
+
+    entries = sorted(read_recording(args.recording), key=lambda entry: entry[0])
+    os.environ.pop("RECORD_UPDATES", None)      # don't record the replay
+    api = FakeBotApi(latency=args.api_latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot, app = await start_bot(api, os.path.join(tmp, "replay.db"), args.unthrottled,
+                                   args.concurrency)
+        updates = [Update.de_json(data, app.bot) for _, data in entries]
+        kinds = {update.update_id: update_kind(data)
+                 for update, (_, data) in zip(updates, entries)}
+        probe = Probe(bot, app, len(updates))
+        await bot.ready()
+        api.calls.clear()
+
+        start = time.perf_counter()
+        first = entries[0][0] if entries else 0.0
+        for (t, _), update in zip(entries, updates):
+            if args.speed:
+                delay = start + (t - first) / args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            probe.enqueued[update.update_id] = time.perf_counter()
+            await app.update_queue.put(update)
+        if updates:
+            await probe.done.wait()
+        handled = time.perf_counter() - start
+        while bot.gateway.pending():
+            await asyncio.sleep(0.05)
+        await api.idle()
+
+        await stop_bot(app)
+        await api.stop()
+
+    by_kind = defaultdict(list)
+    for update_id, latency in probe.by_update.items():
+        by_kind[kinds[update_id]].append(latency)
+    return {
+        "bench": "replay",
+        "commit": git_commit(),
+        "params": vars(args),
+        "updates": len(updates),
+        "elapsed_s": round(handled, 3),
+        "handler_latency": {"all": percentiles(probe.handler),
+                            **{kind: percentiles(samples)
+                               for kind, samples in sorted(by_kind.items())}},
+        "end_to_end_latency": percentiles(probe.end_to_end),
+        "outbound": dict(api.calls),
+    }
+
+
+# -------------------- COMPARE --------------------
+def compare(before: dict, after: dict) -> str:
+    def delta(a, b):
+        if not a:
+            return "new" if b else "="
+        return f"{(b - a) / a * 100:+.0f}%"
+
+    lines = [f"{before.get('commit')} -> {after.get('commit')}",
+             f"updates: {before['updates']} -> {after['updates']}", "",
+             "handler latency (ms)        p50            p95            p99"]
+    kinds = sorted(set(before["handler_latency"]) | set(after["handler_latency"]))
+    for kind in kinds:
+        a, b = before["handler_latency"].get(kind, {}), after["handler_latency"].get(kind, {})
+        cells = [f"{a.get(q, 0):>6g}->{b.get(q, 0):<6g} {delta(a.get(q), b.get(q, 0)):>5}"
+                 for q in ("p50_ms", "p95_ms", "p99_ms")]
+        lines.append(f"  {kind:<24}" + "  ".join(cells))
+
+    lines += ["", "outbound calls"]
+    for method in sorted(set(before["outbound"]) | set(after["outbound"])):
+        a, b = before["outbound"].get(method, 0), after["outbound"].get(method, 0)
+        lines.append(f"  {method:<24}{a:>7} -> {b:<7} {delta(a, b)}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="replay a recording and write a report")
+    run.add_argument("recording", nargs="+", help="JSONL files, rotated parts included")
+    run.add_argument("--speed", type=float, default=1.0,
+                     help="pace multiplier over the recording, 0 = as fast as possible")
+    run.add_argument("--api-latency", type=float, default=0.0, help="fake API latency (s)")
+    run.add_argument("--concurrency", type=int, help="CONCURRENT_UPDATES for the run")
+    run.add_argument("--unthrottled", action="store_true",
+                     help="lift the gateway's rate limits")
+    run.add_argument("--out", help="write the JSON report here instead of stdout")
+
+    diff = sub.add_parser("compare", help="diff two replay reports")
+    diff.add_argument("before")
+    diff.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.before) as a, open(args.after) as b:
+            print(compare(json.load(a), json.load(b)))
+        return
+
+    report = json.dumps(asyncio.run(replay(args)), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark of /search over years of archived weeks.
+
+Creates a database with `--groups` groups, each with `--users` members who
+sign up for a random set of days most weeks over the last `--years` years, closes
+every week through history.archive_weeks (which feeds the FTS index the
+way the weekly summary does), then times search.search() for a mix of
+name, day, month and holiday queries scoped to one group (/search in a
+group) and to several (/search in private, inline queries):
+
+    python bench/search_run.py --groups 2000 --years 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from load_test import git_commit, group_chat_id, percentiles  # noqa: E402
+
+NAMES = ["Sarah", "Tom", "Maria", "John", "Grace", "Peter", "Ruth", "David", "Anna", "Paul",
+         "Esther", "Mark", "Lydia", "James", "Naomi", "Luke"]
+QUERIES = ["sarah", "sarah wednesday", "easter", "christmas 2024", "tom december",
+           "maria monday march", "good friday", "thanksgiving grace", "pa", "unavailable"]
+
+
+def populate(path, groups, users, years, fill, seed):
+    from history import archive_weeks
+    from roster import STUDY_MASK, UNAVAILABLE
+    from schema import migrate, week_start_for
+
+    rng = random.Random(seed)
+    this_week = week_start_for(datetime.now())
+    first = date.fromisoformat(this_week) - timedelta(weeks=52 * years)
+    weeks = [(first + timedelta(weeks=i)).isoformat() for i in range(52 * years)]
+
+    conn = sqlite3.connect(path)
+    migrate(conn, 0, this_week)
+    start = time.perf_counter()
+    for i in range(groups):
+        chat_id = group_chat_id(i)
+        rows = [(chat_id, week, user_id, NAMES[user_id % len(NAMES)],
+                 rng.randint(1, STUDY_MASK) if rng.random() < 0.9 else UNAVAILABLE)
+                for week in weeks for user_id in range(users) if rng.random() < fill]
+        conn.executemany("INSERT INTO signups VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        archive_weeks(conn, chat_id, this_week)
+    archived = time.perf_counter() - start
+    fts_rows, = conn.execute("SELECT count(*) FROM schedule_fts").fetchone()
+    conn.close()
+    return archived, fts_rows
+
+
+async def run(args):
+    from search import search
+    from storage import Storage
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        archived, fts_rows = populate(path, args.groups, args.users, args.years, args.fill,
+                                      args.seed)
+        storage = Storage(path)
+        await storage.open()
+
+        latency = {"group": [], "private": []}
+        for _ in range(args.queries):
+            for scope, count in (("group", 1), ("private", args.member_of)):
+                chat_ids = [group_chat_id(rng.randrange(args.groups)) for _ in range(count)]
+                text = rng.choice(QUERIES)
+                offset = rng.choice((0, 0, 0, 8, 16))
+                start = time.perf_counter()
+                await search(storage, chat_ids, text, offset)
+                latency[scope].append(time.perf_counter() - start)
+
+        await storage.close()
+        db_mb = os.path.getsize(path) / 2 ** 20
+
+    return {
+        "bench": "search",
+        "commit": git_commit(),
+        "params": vars(args),
+        "archive_seconds": round(archived, 3),
+        "fts_rows": fts_rows,
+        "db_mb": round(db_mb, 1),
+        "latency": {scope: percentiles(samples) for scope, samples in latency.items()},
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10, help="members per group")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--fill", type=float, default=0.7,
+                        help="chance a member signs up in a given week")
+    parser.add_argument("--member-of", type=int, default=5,
+                        help="groups searched by a private/inline query")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
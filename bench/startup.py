@@ -0,0 +1,113 @@
+"""Cold-start benchmark.
+
+Starts the bot in polling mode in a fresh interpreter, `--runs` times,
+against a local fake Bot API that hands out one button tap on the first
+getUpdates. Each run reports:
+
+    import_s        importing bot.py (telegram, httpx, our modules)
+    build_s         building the Application
+    db_ready_s      opening and migrating the DB, from the start of the build
+    first_update_s  process spawn to the first update handled
+
+and the JSON report carries the median of each:
+
+    python bench/startup.py --runs 5 --db signups.db
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+from load_test import callback_update, git_commit, group_chat_id  # noqa: E402
+
+
+# -------------------- CHILD --------------------
+def child():
+    marks = {"start": time.time()}
+    import bot
+    marks["imported"] = time.time()
+
+    app = bot.build_application()
+    marks["built"] = time.time()
+    bot.storage._warmup.add_done_callback(lambda _: marks.setdefault("db_ready", time.time()))
+
+    process_update = app.process_update
+
+    async def first_update(update):
+        await process_update(update)
+        marks.setdefault("first_update", time.time())
+        asyncio.get_running_loop().stop()
+
+    app.process_update = first_update
+    app.run_polling()
+    print(json.dumps(marks))
+
+
+# -------------------- PARENT --------------------
+async def one_run(args, tmp, run):
+    api = FakeBotApi()
+    db_path = os.path.join(tmp, f"run{run}.db")
+    if args.db:
+        shutil.copy(args.db, db_path)
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN="123456:bench", BOT_MODE="polling",
+               BOT_API_URL=await api.start(), DB_PATH=db_path, GROUP_CHAT_ID="0")
+    api.queue_update(callback_update(1, group_chat_id(0), 1, "signup_Monday"))
+
+    spawned = time.time()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--child", env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    out, _ = await proc.communicate()
+    await api.stop()
+    marks = json.loads(out.decode().strip().splitlines()[-1])
+    return {
+        "interpreter_s": marks["start"] - spawned,
+        "import_s": marks["imported"] - marks["start"],
+        "build_s": marks["built"] - marks["imported"],
+        "db_ready_s": marks["db_ready"] - marks["imported"],
+        "first_update_s": marks["first_update"] - spawned,
+    }
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [await one_run(args, tmp, i) for i in range(args.runs)]
+    return {
+        "bench": "startup",
+        "commit": git_commit(),
+        "params": vars(args),
+        "median": {k: round(statistics.median(r[k] for r in runs), 4) for k in runs[0]},
+        "runs": [{k: round(v, 4) for k, v in r.items()} for r in runs],
+    }
+
+
+def main():
+    if "--child" in sys.argv:
+        child()
+        return
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", help="start each run from a copy of this database")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+import asyncio
+import logging
+import os
+import signal
+from datetime import datetime
+import pytz
+
+from telegram import (
+    InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
+    InputTextMessageContent, Update,
+)
+from telegram.ext import (
+    ApplicationBuilder,
+    CommandHandler,
+    CallbackQueryHandler,
+    ContextTypes,
+    InlineQueryHandler,
+    TypeHandler,
+)
+
+import metrics
+from config import (
+    TOKEN, GROUP_CHAT_ID, TIMEZONE, SIGNUP_AT, SUMMARY_AT, SCHEDULE_SPREAD,
+    SCHEDULE_GRACE, DB_PATH, BOT_API_URL, API_POOL_SIZE, DB_FLUSH_INTERVAL, DB_FLUSH_MAX,
+    API_GLOBAL_RATE, API_CHAT_RATE, API_CHAT_BURST, BOT_MODE, METRICS_PORT, ADMIN_IDS,
+    CONCURRENT_UPDATES, DAY_CAPACITY, REMIND_AT, REMINDER_INTERVAL, REMINDER_CHUNK, PROFILE_DIR,
+    PROFILE_INTERVAL, PROFILE_MAX_SECONDS, RECORD_UPDATES, RECORD_MAX_MB, RECORD_BACKUPS,
+    RECORD_ANONYMIZE,
+)
+from storage import Storage
+from locks import KeyedLock
+from gateway import ApiGateway, INTERACTIVE, BROADCAST
+from roster import DAY_BITS, Rosters, day_names
+from history import archive_weeks, render_history, render_attendance
+from search import PAGE_SIZE, member_groups, render_results, render_row, search
+from schema import migrate, week_start_for
+from scheduler import GroupScheduler
+from reminders import ReminderEngine
+from profiler import SamplingProfiler
+from webhook import shard_of
+
+logger = logging.getLogger(__name__)
+
+# -------------------- TELEGRAM API --------------------
+gateway = ApiGateway(global_rate=API_GLOBAL_RATE, global_burst=API_GLOBAL_RATE,
+                     chat_rate=API_CHAT_RATE, chat_burst=API_CHAT_BURST)
+
+# -------------------- DATABASE --------------------
+storage = Storage(DB_PATH, DB_FLUSH_INTERVAL, DB_FLUSH_MAX)
+rosters = Rosters(storage, DAY_CAPACITY)
+
+def current_week(chat_id: int = None):
+    return week_start_for(datetime.now(pytz.timezone(scheduler.timezone(chat_id))))
+
+def init_db():
+    """Open and migrate the database on the storage thread, without waiting."""
+    storage.warm_up(migrate, GROUP_CHAT_ID, current_week())
+
+def get_roster(chat_id: int):
+    return rosters.get(chat_id, current_week(chat_id))
+
+async def get_signup_table(chat_id: int):
+    return await get_roster(chat_id).render()
+
+# -------------------- SIGNUP MESSAGE --------------------
+SIGNUP_PROMPT = "\nTap every day you can make; tap a day again to take it off 👇"
+
+SIGNUP_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📘 Monday", callback_data="signup_Monday"),
+        InlineKeyboardButton("📗 Tuesday", callback_data="signup_Tuesday"),
+    ],
+    [
+        InlineKeyboardButton("📙 Wednesday", callback_data="signup_Wednesday"),
+        InlineKeyboardButton("📕 Thursday", callback_data="signup_Thursday"),
+    ],
+    [
+        InlineKeyboardButton("🚫 Not Available", callback_data="signup_Unavailable"),
+        InlineKeyboardButton("Cancel Signup", callback_data="cancel_signup"),
+    ]
+])
+
+def content_hash(text: str, reply_markup) -> int:
+    return hash((text, reply_markup.to_json()))
+
+async def send_signup(context: ContextTypes.DEFAULT_TYPE, chat_id: int = None,
+                      priority: int = INTERACTIVE):
+    if chat_id is None:
+        chat_id = GROUP_CHAT_ID
+    await ready()
+
+    roster = get_roster(chat_id)
+    signup_text = await roster.render() + SIGNUP_PROMPT
+    message = await gateway.send_message(
+        chat_id,
+        signup_text,
+        priority=priority,
+        parse_mode="Markdown",
+        reply_markup=SIGNUP_KEYBOARD
+    )
+    await roster.track(message.message_id, content_hash(signup_text, SIGNUP_KEYBOARD))
+    # Taps that landed while the message was on its way aren't in it yet.
+    await sync_signup_messages(chat_id)
+
+@metrics.timed
+async def manual_send_signup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await ready()
+    await scheduler.ensure_group(update.effective_chat.id)
+    await send_signup(context, update.effective_chat.id)
+
+def edit_live_message(roster, message_id, text, reply_markup, digest):
+    # Not awaited: taps landing before this edit goes out replace its text.
+    fut = gateway.edit_message_text(roster.chat_id, message_id, text,
+                                    parse_mode="Markdown", reply_markup=reply_markup)
+
+    def done(fut):
+        if fut.cancelled() or fut.exception() is None:
+            return
+        if "not found" in str(fut.exception()).lower():
+            asyncio.ensure_future(roster.untrack(message_id))      # deleted from the chat
+        else:
+            roster.forget_content(message_id, digest)
+
+    fut.add_done_callback(done)
+
+async def sync_signup_messages(chat_id: int):
+    """Bring every live signup message of the group up to date with the roster.
+
+    Messages already showing this exact content are skipped, so a tap that
+    changes nothing costs no API call.
+    """
+    roster = get_roster(chat_id)
+    signup_text = await roster.render() + SIGNUP_PROMPT
+    digest = content_hash(signup_text, SIGNUP_KEYBOARD)
+    for message_id in roster.outdated(digest):
+        edit_live_message(roster, message_id, signup_text, SIGNUP_KEYBOARD, digest)
+
+# -------------------- INLINE CALLBACKS --------------------
+# Updates are processed concurrently. Taps on the same message are applied
+# one at a time, in arrival order, and every roster change re-renders all of
+# the group's live messages with no await in between, so the last edit
+# queued for each message always shows the latest roster; other groups
+# proceed in parallel.
+message_locks = KeyedLock()
+
+def tapped_day(data: str):
+    """The day a day-button tap is for, or None."""
+    # change_* comes from the change-day menu of messages posted before
+    # days could be toggled; the sync after the tap replaces that menu.
+    if data.startswith(("signup_", "change_")) and data != "change_day":
+        day = data.split("_")[1]
+        return day if day in DAY_BITS else None
+    return None
+
+@metrics.timed
+async def handle_signup_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    chat_id = query.message.chat.id
+    message_id = query.message.message_id
+    user_id = query.from_user.id
+    notice = None
+    try:
+        await ready()
+        # A day known to be full is refused from memory, without queueing
+        # behind the other taps on this message.
+        day = tapped_day(query.data)
+        roster = get_roster(chat_id)
+        if (day is not None and not roster.days_of(user_id) & DAY_BITS[day]
+                and roster.is_full(day, user_id)):
+            notice = f"Sorry, {day} is full."
+            return
+        async with message_locks.hold((chat_id, message_id)):
+            notice = await apply_signup_action(chat_id, message_id, user_id,
+                                               query.from_user.first_name, query.data)
+    finally:
+        # Always answered, or the button keeps spinning.
+        await query.answer(notice)
+
+async def apply_signup_action(chat_id, message_id, user_id, user_name, data):
+    """Apply a tap; return a notice for the tapping user, if any."""
+    roster = get_roster(chat_id)
+    # A tapped message is live even if it predates tracking or a restart.
+    await roster.track(message_id)
+
+    day = tapped_day(data)
+    if day is not None:
+        if not await roster.toggle(user_id, user_name, day):
+            return f"Sorry, {day} is full."
+
+    elif data == "cancel_signup":
+        await roster.cancel(user_id)
+
+    await sync_signup_messages(chat_id)
+    days = day_names(roster.days_of(user_id))
+    return f"Your days: {', '.join(days)}" if days else "You're not signed up."
+
+# -------------------- SCHEDULED SUNDAY MESSAGE --------------------
+async def send_weekly_schedule(context: ContextTypes.DEFAULT_TYPE, chat_id: int = None):
+    if chat_id is None:
+        chat_id = GROUP_CHAT_ID
+
+    signup_text = await get_signup_table(chat_id)
+    await gateway.send_message(
+        chat_id,
+        "📖 *This Week’s Bible Study Schedule*\n\n" + signup_text + "\n🕘 Zoom: [link]",
+        priority=BROADCAST,
+        parse_mode="Markdown"
+    )
+
+async def weekly_summary(chat_id: int):
+    """Sunday job: post the schedule, then archive the weeks that are over."""
+    try:
+        await send_weekly_schedule(None, chat_id)
+    finally:
+        weeks = await storage.run(archive_weeks, chat_id, current_week(chat_id))
+        if weeks:
+            logger.info("Archived %s week(s) for chat %s", weeks, chat_id)
+
+# -------------------- SCHEDULER --------------------
+scheduler = GroupScheduler(
+    storage,
+    jobs={
+        "signup": lambda chat_id: send_signup(None, chat_id, priority=BROADCAST),
+        "summary": weekly_summary,
+    },
+    default_slots={"signup": SIGNUP_AT, "summary": SUMMARY_AT},
+    default_timezone=TIMEZONE,
+    spread=SCHEDULE_SPREAD,
+    grace=SCHEDULE_GRACE,
+)
+
+reminders = ReminderEngine(storage, gateway, default_slot=REMIND_AT,
+                           interval=REMINDER_INTERVAL, chunk=REMINDER_CHUNK)
+
+# -------------------- COMMANDS --------------------
+def reply(update: Update, text: str, **kwargs):
+    """Answer a command, as a reply to it, through the rate-limited gateway.
+
+    The reply can sit in the queue a while; if the command is deleted
+    meanwhile it goes out as a plain message.
+    """
+    return gateway.send_message(update.effective_chat.id, text,
+                                reply_to_message_id=update.message.message_id,
+                                allow_sending_without_reply=True, **kwargs)
+
+@metrics.timed
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await reply(update,
+        "👋 Welcome! Use /send_signup to post this week’s signup form."
+    )
+
+async def is_chat_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.type == "private":
+        return True
+    member = await context.bot.get_chat_member(update.effective_chat.id, update.effective_user.id)
+    return member.status in ("creator", "administrator")
+
+@metrics.timed
+async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/settings [timezone|signup|summary|remind|quiet|capacity <value>]"""
+    chat_id = update.effective_chat.id
+    args = context.args
+    await ready()
+    if args:
+        if not await is_chat_admin(update, context):
+            await reply(update, "Only group admins can change the settings.")
+            return
+        key, value = args[0].lower(), " ".join(args[1:])
+        try:
+            if key == "timezone":
+                await scheduler.add_group(chat_id, timezone=value)
+            elif key in ("signup", "summary"):
+                await scheduler.add_group(chat_id, slots={key: value})
+            elif key == "remind":
+                await scheduler.ensure_group(chat_id)
+                await reminders.set_reminder(chat_id, value.lower())
+            elif key == "quiet":
+                await scheduler.ensure_group(chat_id)
+                await reminders.set_quiet_hours(chat_id, value.lower())
+            elif key == "capacity":
+                await scheduler.ensure_group(chat_id)
+                await rosters.set_capacity(chat_id, int(value))
+            else:
+                raise ValueError(key)
+        except (ValueError, LookupError):
+            await reply(update,
+                "Usage: /settings timezone America/New_York | signup fri 12:00 | "
+                "summary sun 21:00 | remind sun 12:00 | remind off | quiet 22-8 | quiet off | "
+                "capacity 1 (0 = no limit)")
+            return
+    else:
+        await scheduler.ensure_group(chat_id)
+
+    group = scheduler.groups[chat_id]
+    remind_at, quiet = await reminders.settings(chat_id)
+    roster = get_roster(chat_id)
+    await roster.ensure_loaded()
+    await reply(update,
+        f"🕰 Timezone: {group.timezone}\n"
+        f"📝 Signup post: {group.slots['signup']}\n"
+        f"📖 Schedule post: {group.slots['summary']}\n"
+        f"⚠️ Open-days reminder: {remind_at}\n"
+        f"🌙 Quiet hours: {quiet}\n"
+        f"👥 People per day: {roster.capacity or 'no limit'}"
+    )
+
+@metrics.timed
+async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/history [weeks]"""
+    weeks = int(context.args[0]) if context.args and context.args[0].isdigit() else 8
+    await ready()
+    text = await render_history(storage, update.effective_chat.id, max(1, min(weeks, 52)))
+    await reply(update, text, parse_mode="Markdown")
+
+@metrics.timed
+async def attendance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await ready()
+    text = await render_attendance(storage, update.effective_chat.id)
+    await reply(update, text, parse_mode="Markdown")
+
+@metrics.timed
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    worker, workers = context.bot_data["shard"]
+    text = metrics.render_summary()
+    if workers > 1:
+        text += f"\n\n_worker {worker + 1} of {workers}_"
+    await reply(update, text, parse_mode="Markdown")
+
+# -------------------- SEARCH --------------------
+# Full-text search over archived weeks (see search.py). In a group it covers
+# that group; in a private chat or inline, every group the user has signed
+# up in.
+async def search_scope(chat, user_id):
+    if chat is not None and chat.type != "private":
+        return [chat.id]
+    return await member_groups(storage, user_id)
+
+def search_keyboard(text, offset, count, more):
+    pages = []
+    if offset:
+        pages.append(("⬅️ Newer", f"search_{max(0, offset - PAGE_SIZE)}_{text}"))
+    if more:
+        pages.append(("Older ➡️", f"search_{offset + count}_{text}"))
+    # callback_data is capped at 64 bytes; long queries just don't page.
+    buttons = [InlineKeyboardButton(label, callback_data=data)
+               for label, data in pages if len(data.encode()) <= 64]
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+@metrics.timed
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <names, days, months, holidays...>"""
+    text = " ".join(context.args or [])
+    if not text:
+        await reply(update, "Usage: /search sarah wednesday, /search easter 2024")
+        return
+    await ready()
+    chat_ids = await search_scope(update.effective_chat, update.effective_user.id)
+    rows, more = await search(storage, chat_ids, text)
+    await reply(update, render_results(text, rows, 0),
+                reply_markup=search_keyboard(text, 0, len(rows), more))
+
+@metrics.timed
+async def search_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    _, offset, text = query.data.split("_", 2)
+    offset = int(offset)
+    await ready()
+    chat_ids = await search_scope(query.message.chat, query.from_user.id)
+    rows, more = await search(storage, chat_ids, text, offset)
+    gateway.edit_message_text(query.message.chat.id, query.message.message_id,
+                              render_results(text, rows, offset),
+                              reply_markup=search_keyboard(text, offset, len(rows), more))
+    await query.answer()
+
+@metrics.timed
+async def search_inline(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    await ready()
+    chat_ids = await member_groups(storage, query.from_user.id)
+    rows, more = await search(storage, chat_ids, query.query, offset)
+    results = [
+        InlineQueryResultArticle(
+            id=f"{chat_id}:{week_start}:{day}",
+            title=f"{day} {week_start}",
+            description=names,
+            input_message_content=InputTextMessageContent(render_row(week_start, day, names)),
+        )
+        for chat_id, week_start, day, names in rows
+    ]
+    await query.answer(results, cache_time=60, is_personal=True,
+                       next_offset=str(offset + len(rows)) if more else "")
+
+# -------------------- PROFILING --------------------
+# Also toggled by SIGUSR2 (kill -USR2 <pid>), e.g. when the bot is too slow
+# to answer commands.
+profiler = SamplingProfiler(PROFILE_DIR, PROFILE_INTERVAL, PROFILE_MAX_SECONDS)
+
+@metrics.timed
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile start [seconds] | stop"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    args = context.args or ["status"]
+    if args[0] == "start":
+        if profiler.running:
+            await reply(update, "Already profiling; /profile stop to finish.")
+            return
+        try:
+            seconds = float(args[1]) if len(args) > 1 else None
+            if seconds is not None and not seconds > 0:     # also rejects nan
+                raise ValueError(args[1])
+        except ValueError:
+            await reply(update, "Usage: /profile start [seconds] | stop")
+            return
+        seconds = profiler.start(seconds)
+        await reply(update, f"🔬 Profiling for up to {seconds:g}s.")
+    elif args[0] == "stop":
+        path = await asyncio.to_thread(profiler.stop)
+        if path is None:
+            await reply(update, "No profile recorded yet.")
+            return
+        await reply(update, f"{profiler.summary()}\n\n`{path}`", parse_mode="Markdown")
+    else:
+        await reply(update,
+            "Profiling." if profiler.running else "Usage: /profile start [seconds] | stop")
+
+# -------------------- RECORDING --------------------
+# With RECORD_UPDATES set, every update is appended to a JSONL recording
+# that bench/replay.py can play back against another build.
+recorder = None
+
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    recorder.record(update.to_dict())
+
+# -------------------- STARTUP --------------------
+# Startup work that doesn't need the network runs in the background so the
+# first getUpdates (or webhook registration) isn't held up by it; handlers
+# that touch the DB or scheduler await ready() first.
+_startup = None
+
+async def ready():
+    await _startup
+
+async def warm_up(app):
+    worker, workers = app.bot_data["shard"]
+    await storage.ready()
+
+    # Each worker schedules only the groups whose updates it owns.
+    scheduler.owns = reminders.owns = lambda chat_id: shard_of(chat_id, workers) == worker
+    await scheduler.load()
+    if GROUP_CHAT_ID and scheduler.owns(GROUP_CHAT_ID):
+        await scheduler.ensure_group(GROUP_CHAT_ID)
+    scheduler.start()
+    reminders.start()
+
+    if METRICS_PORT:
+        try:
+            app.bot_data["metrics_server"] = await metrics.start_server("0.0.0.0",
+                                                                       METRICS_PORT + worker)
+        except OSError:
+            # Optional: the bot is still worth running without it.
+            logger.exception("Metrics server not started on port %s", METRICS_PORT + worker)
+    logger.info("Startup complete")
+
+def startup_done(task):
+    # Handlers would otherwise re-raise this from ready() on every update
+    # while the process looks healthy.
+    if task.cancelled() or task.exception() is None:
+        return
+    logger.critical("Startup failed, stopping", exc_info=task.exception())
+    # run_polling shuts down on SIGTERM; a webhook worker exits and the
+    # front end stops with it.
+    os.kill(os.getpid(), signal.SIGTERM)
+
+def reload_rosters():
+    # SIGHUP: signups were changed outside the bot (transfer.py import).
+    logger.info("Reloading signups from the database")
+    rosters.invalidate()
+
+async def post_init(app):
+    global _startup
+    worker, workers = app.bot_data["shard"]
+    gateway.start(app.bot, share=1 / workers)
+    _startup = asyncio.create_task(warm_up(app))
+    _startup.add_done_callback(startup_done)
+    try:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGUSR2, profiler.toggle)
+        loop.add_signal_handler(signal.SIGHUP, reload_rosters)
+    except (NotImplementedError, RuntimeError):
+        pass        # no signals on this platform or off the main thread
+
+async def post_shutdown(app):
+    if _startup is not None and not _startup.done():
+        _startup.cancel()
+    if "metrics_server" in app.bot_data:
+        app.bot_data["metrics_server"].close()
+    profiler.stop()
+    if recorder is not None:
+        recorder.close()
+    await reminders.stop()
+    await scheduler.stop()
+    await gateway.stop()
+    await storage.close()
+
+def build_application(worker: int = 0, workers: int = 1):
+    global recorder
+    builder = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .connection_pool_size(API_POOL_SIZE)
+        .pool_timeout(10)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+    if BOT_MODE == "webhook":
+        builder = builder.updater(None)
+    app = builder.build()
+    app.bot_data["shard"] = (worker, workers)
+    init_db()
+
+    if RECORD_UPDATES:
+        from recorder import UpdateRecorder
+        path = RECORD_UPDATES if workers == 1 else f"{RECORD_UPDATES}.worker{worker}"
+        recorder = UpdateRecorder(path, int(RECORD_MAX_MB * 2 ** 20), RECORD_BACKUPS,
+                                  RECORD_ANONYMIZE)
+        app.add_handler(TypeHandler(Update, record_update), group=-1)
+
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("send_signup", manual_send_signup))
+    app.add_handler(CommandHandler("settings", settings))
+    app.add_handler(CommandHandler("history", history))
+    app.add_handler(CommandHandler("attendance", attendance))
+    app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("profile", profile))
+    app.add_handler(CommandHandler("search", search_command))
+    app.add_handler(InlineQueryHandler(search_inline))
+    app.add_handler(CallbackQueryHandler(search_page, pattern="^search_"))
+    app.add_handler(CallbackQueryHandler(handle_signup_actions,
+                                         pattern="^(signup_|change_|cancel_signup|change_day)"))
+    return app
@@ -0,0 +1,38 @@
+import os
+
+# -------------------- CONFIG --------------------
+TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+GROUP_CHAT_ID = int(os.environ.get("GROUP_CHAT_ID", 0))
+TIMEZONE = os.environ.get("TIMEZONE", "America/New_York")           # default for new groups
+SIGNUP_AT = os.environ.get("SIGNUP_AT", "fri 12:00")
+SUMMARY_AT = os.environ.get("SUMMARY_AT", "sun 21:00")
+DAY_CAPACITY = int(os.environ.get("DAY_CAPACITY", 0))              # people per study day; 0 = no limit
+REMIND_AT = os.environ.get("REMIND_AT", "sun 12:00")              # default "unfilled days" reminder
+REMINDER_INTERVAL = float(os.environ.get("REMINDER_INTERVAL", 900)) # seconds between reminder runs
+REMINDER_CHUNK = int(os.environ.get("REMINDER_CHUNK", 500))        # groups read per query
+SCHEDULE_SPREAD = float(os.environ.get("SCHEDULE_SPREAD", 300))    # seconds to spread a fan-out over
+SCHEDULE_GRACE = float(os.environ.get("SCHEDULE_GRACE", 6 * 3600)) # catch up missed posts younger than this
+DB_PATH = os.environ.get("DB_PATH", "signups.db")
+BOT_API_URL = os.environ.get("BOT_API_URL")                        # e.g. a local Bot API server
+API_POOL_SIZE = int(os.environ.get("API_POOL_SIZE", 64))           # concurrent HTTP connections
+CONCURRENT_UPDATES = int(os.environ.get("CONCURRENT_UPDATES", 256)) # updates in flight; 1 = sequential
+DB_FLUSH_INTERVAL = float(os.environ.get("DB_FLUSH_INTERVAL", 0))   # extra group-commit window (s)
+DB_FLUSH_MAX = int(os.environ.get("DB_FLUSH_MAX", 256))            # max writes per commit
+API_GLOBAL_RATE = float(os.environ.get("API_GLOBAL_RATE", 30))     # calls/sec across all chats
+API_CHAT_RATE = float(os.environ.get("API_CHAT_RATE", 20 / 60))    # calls/sec per chat
+API_CHAT_BURST = int(os.environ.get("API_CHAT_BURST", 5))
+BOT_MODE = os.environ.get("BOT_MODE", "polling")                  # "polling" or "webhook"
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")                        # public base URL; unset = don't register
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("PORT", 8080))
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 1))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))              # 0 = off; worker N uses port + N
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")           # /profile output
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005)) # seconds between samples
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 120))
+RECORD_UPDATES = os.environ.get("RECORD_UPDATES")                  # JSONL path; unset = off
+RECORD_MAX_MB = float(os.environ.get("RECORD_MAX_MB", 64))         # rotate after this size
+RECORD_BACKUPS = int(os.environ.get("RECORD_BACKUPS", 5))
+RECORD_ANONYMIZE = os.environ.get("RECORD_ANONYMIZE", "1") != "0"
+ADMIN_IDS = {int(x) for x in os.environ.get("ADMIN_IDS", "").split(",") if x.strip()}
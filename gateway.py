@@ -0,0 +1,267 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BROADCAST = 1
+
+
+# -------------------- TOKEN BUCKET --------------------
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+
+def _log_failure(fut):
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning("Telegram API call failed: %s", fut.exception())
+
+
+class _Call:
+    __slots__ = ("method", "kwargs", "priority", "seq", "waiters", "attempts", "key")
+
+    def __init__(self, method, kwargs, priority, seq, key=None):
+        self.method = method
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.waiters = []
+        self.attempts = 0
+        self.key = key
+
+
+# -------------------- GATEWAY --------------------
+class ApiGateway:
+    """Single exit point for outbound send/edit calls.
+
+    Calls are queued per chat (keeping per-chat order) and released under a
+    global and a per-chat token bucket. Interactive calls are released
+    before broadcasts. An edit of a message that already has an edit
+    waiting in the queue replaces it, so only the latest text is sent.
+    RetryAfter pauses the affected chat for the requested time and the call
+    is retried.
+    """
+
+    def __init__(self, global_rate=30.0, global_burst=30, chat_rate=20 / 60, chat_burst=5,
+                 max_attempts=5):
+        self.bot = None
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self._seq = itertools.count()
+        self._chats = {}        # chat_id -> deque of _Call
+        self._buckets = {}      # chat_id -> TokenBucket
+        self._busy = set()      # chats with a call in flight
+        self._ready = []        # heap of (priority, seq, chat_id)
+        self._delayed = []      # heap of (due, chat_id)
+        self._edits = {}        # (chat_id, message_id) -> queued _Call
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._sending = set()
+
+    def start(self, bot, share: float = 1.0):
+        """Start dispatching. `share` is this process's fraction of the global rate."""
+        self.bot = bot
+        self.global_bucket = TokenBucket(self.global_rate * share,
+                                         max(1, self.global_burst * share))
+        self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for calls in self._chats.values():
+            for call in calls:
+                self._resolve(call, exc=RuntimeError("API gateway stopped"))
+        self._chats.clear()
+
+    # ---------- public API ----------
+    # Both methods queue the call and return a future for its result. Await
+    # it to wait for delivery, or drop it and let the gateway log failures.
+    def send_message(self, chat_id: int, text: str, priority=INTERACTIVE, **kwargs):
+        return self._submit("send_message", chat_id, priority,
+                            dict(kwargs, chat_id=chat_id, text=text))
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str,
+                          priority=INTERACTIVE, **kwargs):
+        key = (chat_id, message_id)
+        kwargs = dict(kwargs, chat_id=chat_id, message_id=message_id, text=text)
+        queued = self._edits.get(key)
+        if queued is not None:
+            metrics.counter("api_edits_coalesced_total").inc()
+            queued.kwargs = kwargs
+            return self._waiter(queued)
+        return self._submit("edit_message_text", chat_id, priority, kwargs, key)
+
+    def pending(self) -> int:
+        """Calls queued or in flight."""
+        return sum(map(len, self._chats.values())) + len(self._busy)
+
+    @staticmethod
+    def _waiter(call):
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_log_failure)
+        call.waiters.append(fut)
+        return fut
+
+    def _submit(self, method, chat_id, priority, kwargs, key=None):
+        call = _Call(method, kwargs, priority, next(self._seq), key)
+        fut = self._waiter(call)
+        if key is not None:
+            self._edits[key] = call
+        queue = self._chats.setdefault(chat_id, deque())
+        queue.append(call)
+        if len(queue) == 1 and chat_id not in self._busy:
+            heapq.heappush(self._ready, (priority, call.seq, chat_id))
+            self._wakeup.set()
+        return fut
+
+    # ---------- dispatch loop ----------
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _release(self, chat_id):
+        self._busy.discard(chat_id)
+        queue = self._chats.get(chat_id)
+        if queue:
+            head = queue[0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+            self._wakeup.set()
+        elif queue is not None:
+            del self._chats[chat_id]
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, chat_id = heapq.heappop(self._delayed)
+                self._release(chat_id)
+
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            wait = self._bucket(chat_id).delay(now)
+            if wait > 0:
+                self._busy.add(chat_id)
+                heapq.heappush(self._delayed, (now + wait, chat_id))
+                continue
+
+            wait = self.global_bucket.delay(now)
+            if wait > 0:
+                heapq.heappush(self._ready, (self._chats[chat_id][0].priority,
+                                             self._chats[chat_id][0].seq, chat_id))
+                await asyncio.sleep(wait)
+                continue
+
+            self.global_bucket.take()
+            self._bucket(chat_id).take()
+            call = self._chats[chat_id].popleft()
+            if call.key is not None and self._edits.get(call.key) is call:
+                del self._edits[call.key]
+            self._busy.add(chat_id)
+            task = asyncio.create_task(self._send(chat_id, call))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, chat_id, call):
+        call.attempts += 1
+        start = time.perf_counter()
+        try:
+            result = await getattr(self.bot, call.method)(**call.kwargs)
+        except RetryAfter as e:
+            metrics.counter("api_retry_after_total", method=call.method).inc()
+            logger.warning("Flood control on chat %s, retrying in %ss", chat_id, e.retry_after)
+            self._retry(chat_id, call, e.retry_after, e)
+            return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                self._resolve(call, result=True)
+            else:
+                metrics.counter("api_errors_total", method=call.method).inc()
+                self._resolve(call, exc=e)
+        except NetworkError as e:
+            metrics.counter("api_errors_total", method=call.method).inc()
+            self._retry(chat_id, call, min(2 ** call.attempts, 30), e)
+            return
+        except Exception as e:
+            metrics.counter("api_errors_total", method=call.method).inc()
+            self._resolve(call, exc=e)
+        else:
+            self._resolve(call, result=result)
+        finally:
+            metrics.histogram("api_seconds", method=call.method).observe(
+                time.perf_counter() - start)
+        self._release(chat_id)
+
+    def _retry(self, chat_id, call, delay, exc):
+        if call.attempts >= self.max_attempts:
+            self._resolve(call, exc=exc)
+            self._release(chat_id)
+            return
+        # A newer edit queued meanwhile supersedes this one.
+        if call.key is not None and call.key in self._edits:
+            self._edits[call.key].waiters.extend(call.waiters)
+        else:
+            if call.key is not None:
+                self._edits[call.key] = call
+            self._chats.setdefault(chat_id, deque()).appendleft(call)
+        until = time.monotonic() + delay
+        self._bucket(chat_id).block(until)
+        heapq.heappush(self._delayed, (until, chat_id))
+        self._wakeup.set()
+
+    @staticmethod
+    def _resolve(call, result=None, exc=None):
+        for fut in call.waiters:
+            if fut.done():
+                continue
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
@@ -0,0 +1,113 @@
+import logging
+
+from telegram.helpers import escape_markdown
+
+from roster import DAYS, DAY_BITS, DAY_LINES
+from search import register
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [day.lower() for day in DAYS]
+ICONS = {"Monday": "📘", "Tuesday": "📗", "Wednesday": "📙", "Thursday": "📕",
+         "Unavailable": "❌"}
+
+# -------------------- ARCHIVE --------------------
+# Every statement reads the same slice of signups: one group's weeks before
+# the current one, a range scan of the primary key.
+_FINISHED = "chat_id = ? AND week_start < ?"
+_COUNTS = ", ".join(f"SUM((days & {bit}) != 0)" for bit in DAY_BITS.values())
+_ADD = ", ".join(f"{col} = {col} + excluded.{col}" for col in COLUMNS)
+# One row per day bit, to fan a member's mask out into the days it holds.
+_DAY_ROWS = "(VALUES " + ", ".join(f"('{day}', {bit})" for day, bit in DAY_BITS.items()) + ")"
+
+ARCHIVE_SQL = [
+    f"INSERT INTO week_totals (chat_id, week_start, {', '.join(COLUMNS)}) "
+    f"SELECT chat_id, week_start, {_COUNTS} FROM signups WHERE {_FINISHED} "
+    f"GROUP BY week_start "
+    f"ON CONFLICT (chat_id, week_start) DO UPDATE SET {_ADD}",
+
+    # user_name comes from the row holding MAX(week_start): the latest name.
+    f"INSERT INTO user_totals (chat_id, user_id, user_name, weeks, {', '.join(COLUMNS)}, last_week) "
+    f"SELECT chat_id, user_id, user_name, COUNT(*), {_COUNTS}, MAX(week_start) "
+    f"FROM signups WHERE {_FINISHED} GROUP BY user_id "
+    f"ON CONFLICT (chat_id, user_id) DO UPDATE SET user_name = excluded.user_name, "
+    f"weeks = weeks + excluded.weeks, {_ADD}, last_week = max(last_week, excluded.last_week)",
+
+    f"INSERT INTO group_totals (chat_id, weeks, {', '.join(COLUMNS)}, first_week, last_week) "
+    f"SELECT chat_id, COUNT(DISTINCT week_start), {_COUNTS}, MIN(week_start), MAX(week_start) "
+    f"FROM signups WHERE {_FINISHED} GROUP BY chat_id "
+    f"ON CONFLICT (chat_id) DO UPDATE SET weeks = weeks + excluded.weeks, {_ADD}, "
+    f"first_week = min(first_week, excluded.first_week), "
+    f"last_week = max(last_week, excluded.last_week)",
+
+    f"INSERT INTO schedule_fts (chat, week, day, names, chat_id, week_start) "
+    f"SELECT chat_token(chat_id), week_words(week_start), d.column1, "
+    f"group_concat(user_name, ', '), chat_id, week_start "
+    f"FROM signups JOIN {_DAY_ROWS} AS d ON days & d.column2 "
+    f"WHERE {_FINISHED} GROUP BY week_start, d.column1",
+
+    f"INSERT OR REPLACE INTO signup_history (chat_id, week_start, user_id, days) "
+    f"SELECT chat_id, week_start, user_id, days FROM signups WHERE {_FINISHED}",
+
+    f"DELETE FROM signups WHERE {_FINISHED}",
+    # Signup messages of finished weeks are no longer kept in sync.
+    f"DELETE FROM live_messages WHERE {_FINISHED}",
+]
+
+
+def archive_weeks(conn, chat_id: int, before: str) -> int:
+    """Move a group's weeks older than `before` into the history; return how many.
+
+    Runs on the storage thread as one transaction. The rows leave signups
+    in the same transaction that adds them to the totals and the search
+    index, so each week is counted exactly once and the totals are plain
+    increments.
+    """
+    args = (chat_id, before)
+    register(conn)
+    conn.execute("BEGIN")
+    try:
+        weeks = conn.execute(ARCHIVE_SQL[0], args).rowcount
+        for sql in ARCHIVE_SQL[1:]:
+            conn.execute(sql, args)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return weeks
+
+
+# -------------------- REPORTS --------------------
+# Both read only the rollups: a few rows per week shown and one per member.
+async def render_history(storage, chat_id: int, weeks: int = 8) -> str:
+    rows = await storage.fetchall(
+        f"SELECT week_start, {', '.join(COLUMNS)} FROM week_totals "
+        f"WHERE chat_id=? ORDER BY week_start DESC LIMIT ?", (chat_id, weeks))
+    if not rows:
+        return "📜 No finished weeks yet."
+    lines = [f"📜 *Last {len(rows)} weeks*\n"]
+    for week_start, *counts in rows:
+        lines.append(f"`{week_start}` " + "  ".join(
+            f"{ICONS[day]} {n}" for day, n in zip(DAYS, counts)))
+    return "\n".join(lines)
+
+
+async def render_attendance(storage, chat_id: int, limit: int = 20) -> str:
+    totals = await storage.fetchall(
+        f"SELECT weeks, first_week, {', '.join(COLUMNS)} FROM group_totals WHERE chat_id=?",
+        (chat_id,))
+    if not totals:
+        return "📊 No finished weeks yet."
+    weeks, first_week, *counts = totals[0]
+    members = await storage.fetchall(
+        "SELECT user_name, weeks, monday + tuesday + wednesday + thursday AS attended "
+        "FROM user_totals WHERE chat_id=? ORDER BY attended DESC, user_name LIMIT ?",
+        (chat_id, limit))
+
+    text = f"📊 *Attendance over {weeks} weeks since {first_week}*\n\n"
+    text += "".join(DAY_LINES[day].format(n) for day, n in zip(DAYS, counts))
+    text += "\n*Members* (sessions / weeks answered)\n"
+    # Names are members' own: escaped, or one `_` or `*` breaks the Markdown.
+    text += "\n".join(f"{escape_markdown(name or '')}: {attended} / {answered}"
+                      for name, answered, attended in members)
+    return text
@@ -0,0 +1,31 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+# -------------------- KEYED LOCKS --------------------
+class KeyedLock:
+    """One asyncio.Lock per key, created on first use and dropped when idle.
+
+    Work on different keys runs concurrently; work on the same key runs one
+    at a time, in arrival order.
+    """
+
+    def __init__(self):
+        self._locks = {}    # key -> [lock, holders + waiters]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
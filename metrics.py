@@ -0,0 +1,185 @@
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket is +Inf.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# -------------------- METRIC TYPES --------------------
+# All updates happen on the event loop thread, so plain attribute
+# arithmetic is enough: no locks on the hot path.
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+# -------------------- REGISTRY --------------------
+_counters = {}
+_histograms = {}
+HELP = {
+    "handler_seconds": "Update handler latency",
+    "handler_errors_total": "Handler invocations that raised",
+    "db_seconds": "Storage call latency, including queueing for the storage thread",
+    "api_seconds": "Outbound Telegram API call latency",
+    "api_errors_total": "Failed outbound Telegram API calls",
+    "api_retry_after_total": "429 RetryAfter responses from Telegram",
+    "api_edits_coalesced_total": "Message edits merged into an already queued edit",
+    "scheduler_lag_seconds": "Delay between a scheduled job's due time and its start",
+    "reminder_run_seconds": "Duration of a reminder run over all groups",
+    "reminders_sent_total": "Unfilled-days reminders sent",
+}
+
+
+def counter(name, **labels) -> Counter:
+    key = (name, tuple(sorted(labels.items())))
+    metric = _counters.get(key)
+    if metric is None:
+        metric = _counters[key] = Counter()
+    return metric
+
+
+def histogram(name, bounds=LATENCY_BUCKETS, **labels) -> Histogram:
+    key = (name, tuple(sorted(labels.items())))
+    metric = _histograms.get(key)
+    if metric is None:
+        metric = _histograms[key] = Histogram(bounds)
+    return metric
+
+
+def timed(fn):
+    """Record latency and failures of an async update handler."""
+    latency = histogram("handler_seconds", handler=fn.__name__)
+    errors = counter("handler_errors_total", handler=fn.__name__)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+    return wrapper
+
+
+# -------------------- EXPORT --------------------
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# HELP bot_{name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE bot_{name} {kind}")
+
+    for (name, labels), metric in sorted(_counters.items()):
+        header(name, "counter")
+        lines.append(f"bot_{name}{_labels(labels)} {metric.value}")
+    for (name, labels), metric in sorted(_histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, n in zip(metric.bounds + (float("inf"),), metric.counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"bot_{name}_bucket{_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"bot_{name}_sum{_labels(labels)} {metric.sum}")
+        lines.append(f"bot_{name}_count{_labels(labels)} {metric.count}")
+    return "\n".join(lines) + "\n"
+
+
+def render_summary() -> str:
+    """Compact human-readable digest for the /stats command."""
+    def ms(seconds):
+        return f"{seconds * 1000:g}ms" if seconds != float("inf") else ">30s"
+
+    lines = ["📊 *Bot stats*"]
+    for title, name in (("Handlers", "handler_seconds"), ("Database", "db_seconds"),
+                        ("Telegram API", "api_seconds"), ("Scheduler lag", "scheduler_lag_seconds"),
+                        ("Reminder runs", "reminder_run_seconds")):
+        rows = [(dict(labels), h) for (n, labels), h in sorted(_histograms.items())
+                if n == name and h.count]
+        if not rows:
+            continue
+        lines.append(f"\n*{title}*")
+        for labels, h in rows:
+            label = " ".join(str(v) for v in labels.values()) or "all"
+            lines.append(f"`{label}`: n={h.count} p50≤{ms(h.quantile(0.5))} "
+                         f"p95≤{ms(h.quantile(0.95))} p99≤{ms(h.quantile(0.99))}")
+
+    counts = [(n, dict(labels), c.value) for (n, labels), c in sorted(_counters.items())
+              if c.value]
+    if counts:
+        lines.append("\n*Counters*")
+        for name, labels, value in counts:
+            lines.append(f"`{' '.join([name, *map(str, labels.values())])}`: {value}")
+    return "\n".join(lines)
+
+
+async def _serve(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if request_line.split(b" ")[1:2] == [b"/metrics"]:
+            body, status = render_prometheus().encode(), "200 OK"
+        else:
+            body, status = b"", "404 Not Found"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_server(host: str, port: int):
+    """Serve GET /metrics in Prometheus text format."""
+    server = await asyncio.start_server(_serve, host, port)
+    logger.info("Metrics on http://%s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,128 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_METRICS_FILE = metrics.__file__
+
+# Leaf frames of threads waiting for work rather than doing it.
+IDLE_FRAMES = ("selectors.py:", "threading.py:", "thread.py:_worker", "queue.py:")
+
+
+# -------------------- SAMPLING PROFILER --------------------
+class SamplingProfiler:
+    """Statistical profiler for the running process, off unless started.
+
+    While running, a daemon thread wakes every `interval` seconds and
+    records the Python stack of every thread (the event loop, the SQLite
+    thread, ...). Stacks inside a metrics.timed handler are rooted at a
+    `handler:<name>` frame. When the window ends the samples are written in
+    collapsed-stack format, one "frame;frame;frame count" line per stack,
+    ready for flamegraph.pl or speedscope. Nothing is hooked while it's
+    stopped, so it costs nothing then.
+    """
+
+    def __init__(self, out_dir: str = "profiles", interval: float = 0.005,
+                 max_seconds: float = 120):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = Counter()
+        self.last_path = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float = None) -> float:
+        """Sample for `seconds` (capped at max_seconds); return the window length."""
+        if self.running:
+            raise RuntimeError("profiler already running")
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        self.samples = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(seconds,),
+                                        name="profiler", daemon=True)
+        self._thread.start()
+        logger.info("Profiling for up to %ss", seconds)
+        return seconds
+
+    def stop(self) -> str:
+        """End the window early; return the path of the written profile."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.last_path
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    # ---------- sampling thread ----------
+    def _sample(self, seconds):
+        me = threading.get_ident()
+        started = time.monotonic()
+        deadline = started + seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.samples[_collapse(names.get(ident, str(ident)), frame)] += 1
+        self.last_path = self._write(time.monotonic() - started)
+
+    def _write(self, elapsed):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, time.strftime("profile-%Y%m%d-%H%M%S")
+                            + f"-{os.getpid()}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info("Profile of %.1fs, %s samples written to %s",
+                    elapsed, sum(self.samples.values()), path)
+        return path
+
+    # ---------- report ----------
+    def summary(self, top: int = 8) -> str:
+        """Busiest handlers and hottest leaf frames of the last window."""
+        handlers, leaves = Counter(), Counter()
+        total = 0
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            if frames[-1].startswith(IDLE_FRAMES):
+                continue        # idle: waiting for work, not doing it
+            total += count
+            leaves[frames[-1]] += count
+            if len(frames) > 1 and frames[1].startswith("handler:"):
+                handlers[frames[1][len("handler:"):]] += count
+        lines = [f"🔬 *Profile*: {total} busy samples"]
+        for title, counter in (("Handlers", handlers), ("Hottest frames", leaves)):
+            if counter:
+                lines.append(f"\n*{title}*")
+                lines += [f"`{name}` {count * 100 / total:.0f}%"
+                          for name, count in counter.most_common(top)]
+        return "\n".join(lines)
+
+
+def _collapse(thread_name, frame) -> str:
+    frames = []
+    handler = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "wrapper" and code.co_filename == _METRICS_FILE:
+            fn = frame.f_locals.get("fn")
+            handler = getattr(fn, "__name__", handler)
+        frames.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+        frame = frame.f_back
+    root = [thread_name] + ([f"handler:{handler}"] if handler else [])
+    return ";".join(root + frames[::-1])
@@ -0,0 +1,104 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+
+# Keys whose values identify a person or a chat.
+ID_PARENTS = {"from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat",
+              "new_chat_member", "old_chat_member", "left_chat_member"}
+NAME_KEYS = {"first_name", "last_name", "username", "title", "phone_number", "bio"}
+TEXT_KEYS = {"text", "caption", "query"}
+OPAQUE_KEYS = {"chat_instance"}
+# Button payloads whose tail is user text: "search_<offset>_<query>", both
+# as tapped ("data") and in a recorded message's keyboard ("callback_data").
+PAYLOAD_KEYS = {"data", "callback_data"}
+TEXT_PAYLOADS = ("search_",)
+
+
+# -------------------- UPDATE RECORDER --------------------
+class UpdateRecorder:
+    """Appends every incoming update, as JSON, to a size-rotated JSONL file.
+
+    Each line is {"t": <receive time>, "update": {...}}. With `anonymize`,
+    user and chat ids are replaced by keyed hashes (stable within one
+    recording, so who-tapped-what patterns survive), names by pseudonyms,
+    and free text by its length. Command words and button payloads are
+    kept, but not command arguments or the query in search buttons.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 << 20, backups: int = 5,
+                 anonymize: bool = True, salt: str = None):
+        self.anonymize = anonymize
+        self._key = (salt or os.urandom(16).hex()).encode()
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                      encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # A private logger: rotation and locking come from the logging module.
+        self._log = logging.getLogger(f"{__name__}.{path}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        self._log.addHandler(handler)
+        logger.info("Recording updates to %s", path)
+
+    def record(self, update: dict):
+        if self.anonymize:
+            update = self._scrub(update)
+        self._log.info(json.dumps({"t": time.time(), "update": update},
+                                  ensure_ascii=False, separators=(",", ":")))
+
+    def close(self):
+        for handler in list(self._log.handlers):
+            handler.close()
+            self._log.removeHandler(handler)
+
+    # ---------- anonymization ----------
+    def _digest(self, value) -> int:
+        return int(hmac.new(self._key, str(value).encode(), hashlib.sha256).hexdigest()[:12], 16)
+
+    def _scrub(self, obj, parent=None):
+        if isinstance(obj, list):
+            return [self._scrub(item, parent) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        clean = {}
+        for key, value in obj.items():
+            if key == "id" and parent in ID_PARENTS and isinstance(value, int):
+                clean[key] = -self._digest(value) if value < 0 else self._digest(value)
+            elif key in NAME_KEYS and isinstance(value, str):
+                clean[key] = f"{key}-{self._digest(value) % 100000}"
+            elif key in OPAQUE_KEYS:
+                clean[key] = str(self._digest(value))
+            elif key in TEXT_KEYS and isinstance(value, str):
+                clean[key] = _mask_text(value)
+            elif (key in PAYLOAD_KEYS and isinstance(value, str)
+                  and value.startswith(TEXT_PAYLOADS)):
+                parts = value.split("_", 2)
+                if len(parts) == 3:
+                    parts[2] = "x" * len(parts[2])
+                clean[key] = "_".join(parts)
+            else:
+                clean[key] = self._scrub(value, key)
+        return clean
+
+
+def _mask_text(text: str) -> str:
+    """Free text -> its length in x's; a command keeps its command word."""
+    if not text.startswith("/"):
+        return "x" * len(text)
+    command, space, args = text.partition(" ")
+    return command + space + "x" * len(args)
+
+
+def read_recording(paths):
+    """Yield (t, update dict) from recording files, in file order."""
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry["t"], entry["update"]
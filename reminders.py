@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+import metrics
+from gateway import BROADCAST
+from roster import DAY_BITS, DAYS
+from schema import week_start_for
+from scheduler import WEEK, next_fire, parse_slot
+
+logger = logging.getLogger(__name__)
+
+STUDY_DAYS = DAYS[:4]       # "Unavailable" is never a day to fill
+
+# Filled days of every due group as one bitmask per group: the OR of its
+# members' masks, built from a MAX per bit. (chat_id, week_start) pairs are
+# passed as JSON; each is one range scan of the signups primary key.
+FILLED_SQL = (
+    "SELECT s.chat_id, " + " | ".join(f"MAX(s.days & {bit})" for bit in DAY_BITS.values())
+    + " FROM json_each(?) AS due "
+    "JOIN signups AS s ON s.chat_id = json_extract(due.value, '$[0]') "
+    "                 AND s.week_start = json_extract(due.value, '$[1]') "
+    "GROUP BY s.chat_id"
+)
+
+
+def parse_quiet(spec: str):
+    """'22-8' -> (22, 8): local hours [22:00, 08:00) with no reminders."""
+    start, end = (int(hour) for hour in spec.split("-"))
+    if not (0 <= start < 24 and 0 <= end < 24):
+        raise ValueError(f"bad quiet hours {spec!r}")
+    return start, end
+
+
+def in_quiet_hours(hour: int, quiet_start, quiet_end) -> bool:
+    if quiet_start is None:
+        return False
+    if quiet_start <= quiet_end:
+        return quiet_start <= hour < quiet_end
+    return hour >= quiet_start or hour < quiet_end
+
+
+# -------------------- REMINDERS --------------------
+class ReminderEngine:
+    """Nudges groups that still have study days nobody signed up for.
+
+    Every `interval` seconds the groups table is walked in chat_id order,
+    `chunk` rows at a time. Whether a group is due (its weekly reminder
+    time has passed this signup week, it wasn't reminded yet, and it's
+    outside its quiet hours) is decided from its row alone; a single
+    aggregated query then returns the filled days of every due group in the
+    chunk. A chunk's reminders are delivered before the next chunk is read,
+    so memory stays bounded however many groups there are.
+    """
+
+    def __init__(self, storage, gateway, default_slot: str = "sun 12:00",
+                 interval: float = 900, chunk: int = 500, owns=lambda chat_id: True):
+        self.storage = storage
+        self.gateway = gateway
+        self.default_slot = default_slot
+        self.interval = interval
+        self.chunk = chunk
+        self.owns = owns
+        self._task = None
+
+    # ---------- settings ----------
+    async def set_reminder(self, chat_id: int, slot: str):
+        """Weekly reminder time ("sun 12:00"), or "off"."""
+        if slot != "off":
+            parse_slot(slot)
+        await self.storage.execute("UPDATE groups SET remind_at=? WHERE chat_id=?",
+                                   (slot, chat_id))
+
+    async def set_quiet_hours(self, chat_id: int, spec: str):
+        """Local hours without reminders ("22-8"), or "off"."""
+        start, end = parse_quiet(spec) if spec != "off" else (None, None)
+        await self.storage.execute("UPDATE groups SET quiet_start=?, quiet_end=? WHERE chat_id=?",
+                                   (start, end, chat_id))
+
+    async def settings(self, chat_id: int):
+        rows = await self.storage.fetchall(
+            "SELECT remind_at, quiet_start, quiet_end FROM groups WHERE chat_id=?", (chat_id,))
+        remind_at, quiet_start, quiet_end = rows[0] if rows else (None, None, None)
+        quiet = f"{quiet_start}-{quiet_end}" if quiet_start is not None else "off"
+        return remind_at or self.default_slot, quiet
+
+    # ---------- run loop ----------
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Reminder run failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Remind every due group with open days; return how many were reminded."""
+        start = time.perf_counter()
+        now = time.time()
+        after, sent = -2 ** 63, 0
+        while True:
+            rows = await self.storage.fetchall(
+                "SELECT chat_id, timezone, remind_at, quiet_start, quiet_end, reminded_week "
+                "FROM groups WHERE chat_id > ? ORDER BY chat_id LIMIT ?", (after, self.chunk))
+            due = {}
+            for row in rows:
+                if self.owns(row[0]):
+                    open_days = self._due(row, now)
+                    if open_days:
+                        due[row[0]] = open_days
+            if due:
+                sent += await self._remind(due)
+            if len(rows) < self.chunk:
+                break
+            after = rows[-1][0]
+        metrics.histogram("reminder_run_seconds").observe(time.perf_counter() - start)
+        if sent:
+            logger.info("Sent %s reminder(s)", sent)
+        return sent
+
+    def _due(self, row, now):
+        """(week_start, study days still ahead) if the group is due a reminder."""
+        chat_id, tz_name, remind_at, quiet_start, quiet_end, reminded_week = row
+        slot = remind_at or self.default_slot
+        if slot == "off":
+            return None
+        tz = pytz.timezone(tz_name)
+        local = datetime.fromtimestamp(now, tz)
+        week = week_start_for(local)
+        if reminded_week == week or in_quiet_hours(local.hour, quiet_start, quiet_end):
+            return None
+        # The latest reminder time must fall in the signup week we're in.
+        last = next_fire(tz_name, slot, now - WEEK)
+        if week_start_for(datetime.fromtimestamp(last, tz)) != week:
+            return None
+        monday = date.fromisoformat(week)
+        ahead = [day for i, day in enumerate(STUDY_DAYS)
+                 if monday + timedelta(days=i) >= local.date()]
+        return (week, ahead) if ahead else None
+
+    async def _remind(self, due: dict) -> int:
+        filled = dict(await self.storage.fetchall(
+            FILLED_SQL, (json.dumps([[chat_id, week] for chat_id, (week, _) in due.items()]),)))
+        reminders = {}
+        for chat_id, (week, ahead) in due.items():
+            unfilled = [day for day in ahead if not filled.get(chat_id, 0) & DAY_BITS[day]]
+            if unfilled:
+                reminders[chat_id] = (week, unfilled)
+        if not reminders:
+            return 0
+
+        # Marked before sending: a reminder is never repeated, even if it failed.
+        await asyncio.gather(*(
+            self.storage.write("UPDATE groups SET reminded_week=? WHERE chat_id=?", (week, chat_id))
+            for chat_id, (week, _) in reminders.items()))
+        sends = [
+            self.gateway.send_message(
+                chat_id,
+                "⚠️ *Reminder:* Some days are still open!\n\n" + ", ".join(unfilled)
+                + "\nPlease sign up if you can 🙏",
+                priority=BROADCAST,
+                parse_mode="Markdown")
+            for chat_id, (_, unfilled) in reminders.items()
+        ]
+        await asyncio.gather(*sends, return_exceptions=True)
+        metrics.counter("reminders_sent_total").inc(len(sends))
+        return len(sends)
@@ -0,0 +1,298 @@
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Unavailable"]
+
+DAY_LINES = {
+    "Monday": "📘 Monday: {}\n",
+    "Tuesday": "📗 Tuesday: {}\n",
+    "Wednesday": "📙 Wednesday: {}\n",
+    "Thursday": "📕 Thursday: {}\n\n",
+    "Unavailable": "❌ Not Available: {}\n",
+}
+
+HEADER = "📅 *Bible Study Signups (Mon–Thu, 9–9:30 PM)*\n\n"
+
+MAX_LIVE_MESSAGES = 5       # newest signup messages per week kept in sync
+
+# A member's days are one small integer: bit i set = available on DAYS[i].
+# "Unavailable" excludes the study days and vice versa.
+DAY_BITS = {day: 1 << i for i, day in enumerate(DAYS)}
+UNAVAILABLE = DAY_BITS["Unavailable"]
+STUDY_MASK = UNAVAILABLE - 1
+ALL_DAYS = (1 << len(DAYS)) - 1
+
+# Sets and clears bits in one statement, so taps by the same member on two
+# messages can't overwrite each other's day.
+SIGNUP_SQL = (
+    "INSERT INTO signups (chat_id, week_start, user_id, user_name, days) "
+    "VALUES (:chat_id, :week_start, :user_id, :user_name, :set) "
+    "ON CONFLICT (chat_id, week_start, user_id) DO UPDATE SET "
+    "user_name = excluded.user_name, days = (days & ~:clear) | :set"
+)
+
+# Takes a seat only if fewer than `capacity` others hold the day, checked and
+# written by one statement: no read-then-write window for a concurrent tap.
+RESERVE_SQL = (
+    "INSERT INTO signups (chat_id, week_start, user_id, user_name, days) "
+    "SELECT :chat_id, :week_start, :user_id, :user_name, :set "
+    "WHERE (SELECT COUNT(*) FROM signups WHERE chat_id = :chat_id "
+    "       AND week_start = :week_start AND days & :set AND user_id != :user_id) < :capacity "
+    "ON CONFLICT (chat_id, week_start, user_id) DO UPDATE SET "
+    "user_name = excluded.user_name, days = (days & ~:clear) | :set"
+)
+
+
+def fmt(names):
+    return ", ".join(names) if names else "—"
+
+
+def day_names(mask: int):
+    return [day for day, bit in DAY_BITS.items() if mask & bit]
+
+
+# -------------------- ROSTER CACHE --------------------
+class Roster:
+    """In-memory copy of one group's week of signups, kept in sync write-through.
+
+    Members are held in parallel arrays ordered by user_id: ids, names and
+    day bitmasks, plus a running count per day. Each day's rendered line is
+    cached and only the days a mutation flips are re-rendered, so serving
+    the table never reads the DB.
+
+    It also tracks the week's live signup messages, each with a hash of the
+    content it was last sent, so callers can skip edits that change nothing.
+
+    With a `capacity`, each study day takes at most that many people.
+    """
+
+    __slots__ = ("storage", "chat_id", "week_start", "default_capacity", "capacity",
+                 "messages", "_users", "_names", "_masks", "_counts", "_lines", "_text",
+                 "_loaded", "_loading")
+
+    def __init__(self, storage, chat_id: int, week_start: str, capacity: int = 0):
+        self.storage = storage
+        self.chat_id = chat_id
+        self.week_start = week_start
+        self.default_capacity = capacity
+        self.capacity = capacity
+        self._users = array("q")
+        self._names = []
+        self._masks = array("B")
+        self._counts = array("H", [0] * len(DAYS))
+        self._lines = [""] * len(DAYS)
+        self._text = None
+        self._loaded = False
+        self._loading = None
+        self.messages = {}          # live message_id -> hash of its last sent content
+
+    async def load(self):
+        rows = await self.storage.fetchall(
+            "SELECT user_id, user_name, days FROM signups "
+            "WHERE chat_id=? AND week_start=? AND days != 0 ORDER BY user_id",
+            (self.chat_id, self.week_start))
+        self._users = array("q", [row[0] for row in rows])
+        self._names = [row[1] for row in rows]
+        self._masks = array("B", [row[2] & ALL_DAYS for row in rows])
+        self._counts = array("H", [sum(1 for mask in self._masks if mask & bit)
+                                   for bit in DAY_BITS.values()])
+        self._lines = [self._render_line(i) for i in range(len(DAYS))]
+        self._text = None
+        rows = await self.storage.fetchall(
+            "SELECT message_id FROM live_messages WHERE chat_id=? AND week_start=?",
+            (self.chat_id, self.week_start))
+        self.messages = {message_id: None for message_id, in rows}
+        rows = await self.storage.fetchall(
+            "SELECT day_capacity FROM groups WHERE chat_id=?", (self.chat_id,))
+        capacity = rows[0][0] if rows else None
+        self.capacity = self.default_capacity if capacity is None else capacity
+        self._loaded = True
+
+    def invalidate(self):
+        """Drop the cache; call after editing the signups table outside the bot."""
+        self._loaded = False
+        self._text = None
+
+    async def ensure_loaded(self):
+        # Concurrent callers share one in-flight load.
+        if not self._loaded:
+            if self._loading is None:
+                self._loading = asyncio.ensure_future(self.load())
+                self._loading.add_done_callback(lambda _: setattr(self, "_loading", None))
+            await asyncio.shield(self._loading)
+
+    # ---------- mutations ----------
+    # Load before writing so a concurrent load's snapshot can't race the write.
+    async def toggle(self, user_id: int, user_name: str, day: str) -> bool:
+        """Add `day` to a user's days, or take it off; False if the day is full."""
+        await self.ensure_loaded()
+        bit = DAY_BITS[day]
+        if self.days_of(user_id) & bit:
+            set_bits, clear = 0, bit
+        else:
+            set_bits, clear = bit, STUDY_MASK if bit == UNAVAILABLE else UNAVAILABLE
+        params = {"chat_id": self.chat_id, "week_start": self.week_start, "user_id": user_id,
+                  "user_name": user_name, "set": set_bits, "clear": clear}
+        if self.capacity and set_bits & STUDY_MASK:
+            if self.is_full(day, user_id):
+                return False        # known full: no DB round trip
+            reserved = await self.storage.write(RESERVE_SQL, dict(params, capacity=self.capacity),
+                                                rowcount=True)
+            if not reserved:
+                return False
+        else:
+            await self.storage.write(SIGNUP_SQL, params)
+        # Apply to the current mask: another tap may have landed during the write.
+        mask = (self.days_of(user_id) & ~clear) | set_bits
+        self._set(user_id, user_name, mask)
+        if not mask:
+            await self.storage.write(
+                "DELETE FROM signups WHERE chat_id=? AND week_start=? AND user_id=? AND days=0",
+                (self.chat_id, self.week_start, user_id))
+        return True
+
+    def days_of(self, user_id: int) -> int:
+        """The user's day bitmask; 0 if they haven't signed up."""
+        i = bisect_left(self._users, user_id)
+        if i < len(self._users) and self._users[i] == user_id:
+            return self._masks[i]
+        return 0
+
+    def is_full(self, day: str, user_id: int) -> bool:
+        """Whether `day` has no seat left for user_id (who may already hold one)."""
+        bit = DAY_BITS.get(day, UNAVAILABLE)
+        if not self.capacity or bit == UNAVAILABLE:
+            return False
+        taken = self._counts[DAYS.index(day)] - bool(self.days_of(user_id) & bit)
+        return taken >= self.capacity
+
+    def best_day(self):
+        """The study day most people can make (earliest on a tie), or None."""
+        counts = self._counts[:len(DAYS) - 1]
+        best = max(counts)
+        return (DAYS[counts.index(best)], best) if best else None
+
+    async def cancel(self, user_id: int):
+        await self.ensure_loaded()
+        await self.storage.write(
+            "DELETE FROM signups WHERE chat_id=? AND week_start=? AND user_id=?",
+            (self.chat_id, self.week_start, user_id))
+        self._set(user_id, None, 0)
+
+    def _set(self, user_id, user_name, mask):
+        i = bisect_left(self._users, user_id)
+        present = i < len(self._users) and self._users[i] == user_id
+        old = self._masks[i] if present else 0
+        if mask and present:
+            renamed = self._names[i] != user_name
+            self._names[i] = user_name
+            self._masks[i] = mask
+        elif mask:
+            renamed = True
+            self._users.insert(i, user_id)
+            self._names.insert(i, user_name)
+            self._masks.insert(i, mask)
+        elif present:
+            renamed = False
+            del self._users[i], self._names[i], self._masks[i]
+        else:
+            return
+        changed = old ^ mask
+        touched = changed | mask if renamed else changed
+        for day_index, bit in enumerate(DAY_BITS.values()):
+            if changed & bit:
+                self._counts[day_index] += 1 if mask & bit else -1
+            if touched & bit:
+                self._lines[day_index] = self._render_line(day_index)
+                self._text = None
+
+    # ---------- live messages ----------
+    async def track(self, message_id: int, content_hash=None):
+        """Add a signup message to the live set; the oldest beyond the cap are dropped."""
+        await self.ensure_loaded()
+        if message_id in self.messages:
+            return
+        if len(self.messages) >= MAX_LIVE_MESSAGES and message_id < min(self.messages):
+            return      # older than every message kept: it was evicted, leave it out
+        await self.storage.write(
+            "INSERT OR IGNORE INTO live_messages (chat_id, week_start, message_id) "
+            "VALUES (?, ?, ?)", (self.chat_id, self.week_start, message_id))
+        self.messages[message_id] = content_hash
+        while len(self.messages) > MAX_LIVE_MESSAGES:
+            await self.untrack(min(self.messages))
+
+    async def untrack(self, message_id: int):
+        self.messages.pop(message_id, None)
+        await self.storage.write(
+            "DELETE FROM live_messages WHERE chat_id=? AND week_start=? AND message_id=?",
+            (self.chat_id, self.week_start, message_id))
+
+    def outdated(self, content_hash, message_ids=None):
+        """Live messages not showing `content_hash`; they are recorded as showing it."""
+        if message_ids is None:
+            message_ids = list(self.messages)
+        stale = [message_id for message_id in message_ids
+                 if message_id in self.messages and self.messages[message_id] != content_hash]
+        for message_id in stale:
+            self.messages[message_id] = content_hash
+        return stale
+
+    def forget_content(self, message_id: int, content_hash):
+        """An edit to `content_hash` failed: resend it next time."""
+        if self.messages.get(message_id) == content_hash:
+            self.messages[message_id] = None
+
+    # ---------- rendering ----------
+    def _render_line(self, i):
+        # user_id order: the same order a reload from the table produces.
+        bit = 1 << i
+        return DAY_LINES[DAYS[i]].format(
+            fmt([name for name, mask in zip(self._names, self._masks) if mask & bit]))
+
+    async def render(self):
+        await self.ensure_loaded()
+        if self._text is None:
+            best = self.best_day()
+            footer = f"⭐ Best day so far: {best[0]} ({best[1]})\n" if best else ""
+            self._text = HEADER + "".join(self._lines) + footer
+        return self._text
+
+
+class Rosters:
+    """Loaded rosters keyed by (chat_id, week_start).
+
+    Only the newest week of each group is kept; asking for a new week drops
+    the group's previous one.
+    """
+
+    def __init__(self, storage, capacity: int = 0):
+        self.storage = storage
+        self.capacity = capacity
+        self._rosters = {}
+
+    def get(self, chat_id: int, week_start: str) -> Roster:
+        roster = self._rosters.get(chat_id)
+        if roster is None or roster.week_start != week_start:
+            roster = Roster(self.storage, chat_id, week_start, self.capacity)
+            self._rosters[chat_id] = roster
+        return roster
+
+    async def set_capacity(self, chat_id: int, capacity: int):
+        """People per study day for a group; 0 = no limit."""
+        if capacity < 0:
+            raise ValueError(capacity)
+        await self.storage.execute("UPDATE groups SET day_capacity=? WHERE chat_id=?",
+                                   (capacity, chat_id))
+        if chat_id in self._rosters:
+            self._rosters[chat_id].capacity = capacity
+
+    def invalidate(self, chat_id: int = None):
+        """Drop cached rosters for one group, or for all groups."""
+        if chat_id is None:
+            self._rosters.clear()
+        else:
+            self._rosters.pop(chat_id, None)
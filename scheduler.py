@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, time as dtime
+
+import pytz
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+WEEK = 7 * 24 * 3600
+
+
+def parse_slot(slot: str):
+    """'fri 12:00' -> (4, 12, 0)."""
+    dow, hhmm = slot.lower().split()
+    hour, minute = hhmm.split(":")
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"bad time {hhmm!r}")
+    return WEEKDAYS.index(dow[:3]), hour, minute
+
+
+def next_fire(tz_name: str, slot: str, after: float) -> float:
+    """First occurrence of the weekly `slot` in `tz_name` strictly after `after`."""
+    tz = pytz.timezone(tz_name)
+    dow, hour, minute = parse_slot(slot)
+    local = datetime.fromtimestamp(after, tz)
+    day = local.date() + timedelta(days=(dow - local.weekday()) % 7)
+    for week in (0, 1):
+        fire = tz.localize(datetime.combine(day + timedelta(weeks=week), dtime(hour, minute)))
+        if fire.timestamp() > after:
+            return fire.timestamp()
+
+
+class Group:
+    __slots__ = ("chat_id", "timezone", "slots", "gen")
+
+    def __init__(self, chat_id, timezone, slots):
+        self.chat_id = chat_id
+        self.timezone = timezone
+        self.slots = slots          # job name -> "dow HH:MM"
+        self.gen = 0
+
+
+# -------------------- SCHEDULER --------------------
+class GroupScheduler:
+    """Weekly per-group posts driven by a single min-heap of fire times.
+
+    Every (group, job) pair has one heap entry; adding or rescheduling a
+    group is a heap push, and stale entries are skipped lazily by
+    generation. A fire is delayed by a stable per-group offset inside
+    `spread` seconds so groups sharing a posting time don't all hit the
+    API at once. The last fire of every job is persisted; a fire missed
+    while the bot was down is caught up if it is less than `grace` seconds
+    old and skipped otherwise.
+    """
+
+    def __init__(self, storage, jobs: dict, default_slots: dict, default_timezone: str,
+                 spread: float = 300, grace: float = 6 * 3600, owns=lambda chat_id: True):
+        self.storage = storage
+        self.jobs = jobs                    # job name -> async fn(chat_id)
+        self.default_slots = default_slots
+        self.default_timezone = default_timezone
+        self.spread = spread
+        self.grace = grace
+        self.owns = owns
+        self.groups = {}
+        self._heap = []                     # (due, scheduled, chat_id, job, gen)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def timezone(self, chat_id: int) -> str:
+        group = self.groups.get(chat_id)
+        return group.timezone if group else self.default_timezone
+
+    def _offset(self, chat_id):
+        # Knuth multiplicative hash: stable across restarts, evenly spread.
+        return (chat_id * 2654435761 % 2 ** 32) / 2 ** 32 * self.spread
+
+    def _push(self, group, job, scheduled):
+        # Catch-up fires (scheduled in the past) are spread from now.
+        due = max(scheduled, time.time()) + self._offset(group.chat_id)
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, scheduled, group.chat_id, job, group.gen))
+
+    # ---------- loading ----------
+    async def load(self):
+        rows = await self.storage.fetchall(
+            "SELECT g.chat_id, g.timezone, g.signup_at, g.summary_at, g.created_at, "
+            "       s.job, s.last_fire "
+            "FROM groups g LEFT JOIN schedule_state s ON s.chat_id = g.chat_id")
+        self.groups = {}
+        self._heap = []
+        last = {}
+        for chat_id, tz, signup_at, summary_at, created_at, job, last_fire in rows:
+            if not self.owns(chat_id):
+                continue
+            if chat_id not in self.groups:
+                self.groups[chat_id] = Group(chat_id, tz, {"signup": signup_at,
+                                                            "summary": summary_at})
+                last[chat_id] = {"signup": created_at, "summary": created_at}
+            if job is not None:
+                last[chat_id][job] = last_fire
+
+        now = time.time()
+        for chat_id, group in self.groups.items():
+            for job, slot in group.slots.items():
+                scheduled = next_fire(group.timezone, slot, last[chat_id][job])
+                if scheduled > now:
+                    self._push(group, job, scheduled)
+                    continue
+                # Missed while down: several missed weeks collapse into the latest.
+                scheduled = next_fire(group.timezone, slot, now - WEEK)
+                if now - scheduled > self.grace:
+                    logger.info("Skipping missed %s for chat %s (due %s)", job, chat_id,
+                                datetime.fromtimestamp(scheduled).isoformat())
+                    scheduled = next_fire(group.timezone, slot, now)
+                self._push(group, job, scheduled)
+        logger.info("Scheduler loaded %s groups", len(self.groups))
+
+    # ---------- groups ----------
+    async def ensure_group(self, chat_id: int):
+        if chat_id not in self.groups:
+            await self.add_group(chat_id)
+
+    async def add_group(self, chat_id: int, timezone: str = None, slots: dict = None):
+        """Register a group, or update its timezone/posting times."""
+        group = self.groups.get(chat_id)
+        timezone = timezone or (group.timezone if group else self.default_timezone)
+        slots = dict(group.slots if group else self.default_slots, **(slots or {}))
+        for slot in slots.values():
+            parse_slot(slot)
+        pytz.timezone(timezone)
+
+        await self.storage.execute(
+            "INSERT INTO groups (chat_id, timezone, signup_at, summary_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (chat_id) DO UPDATE SET "
+            "timezone=excluded.timezone, signup_at=excluded.signup_at, "
+            "summary_at=excluded.summary_at",
+            (chat_id, timezone, slots["signup"], slots["summary"], time.time()))
+        if not self.owns(chat_id):
+            return
+        if group is None:
+            group = self.groups[chat_id] = Group(chat_id, timezone, slots)
+        else:
+            group.timezone, group.slots = timezone, slots
+            group.gen += 1
+        now = time.time()
+        for job, slot in slots.items():
+            self._push(group, job, next_fire(timezone, slot, now))
+
+    # ---------- run loop ----------
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, scheduled, chat_id, job, gen = heapq.heappop(self._heap)
+            group = self.groups.get(chat_id)
+            if group is None or group.gen != gen:
+                continue
+            metrics.histogram("scheduler_lag_seconds", job=job).observe(time.time() - due)
+            self._push(group, job, next_fire(group.timezone, group.slots[job],
+                                             max(scheduled, time.time())))
+            task = asyncio.create_task(self._fire(chat_id, job, scheduled))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, chat_id, job, scheduled):
+        try:
+            await self.jobs[job](chat_id)
+        except Exception:
+            # Recorded as fired anyway: a failing post is not retried every restart.
+            logger.exception("Scheduled %s for chat %s failed", job, chat_id)
+        await self.storage.write(
+            "INSERT OR REPLACE INTO schedule_state (chat_id, job, last_fire) VALUES (?, ?, ?)",
+            (chat_id, job, scheduled))
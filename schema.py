@@ -0,0 +1,266 @@
+import logging
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def week_start_for(now: datetime) -> str:
+    """ISO date of the Monday of the study week that `now` signs up for.
+
+    Friday to Sunday already belong to the coming week, matching the
+    Friday signup post.
+    """
+    d = (now + timedelta(days=3)).date()
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+# -------------------- SCHEMA --------------------
+# Signups are partitioned by group and study week. The table is clustered on
+# its primary key, so every per-group lookup is a range scan of one
+# (chat_id, week_start) slice no matter how many rows the table holds.
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS signups (
+        chat_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        user_name TEXT,
+        day TEXT,
+        PRIMARY KEY (chat_id, week_start, user_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS signups_by_day
+        ON signups (chat_id, week_start, day, user_name);
+'''
+
+# Groups the bot posts to, with their own timezone and weekly posting slots
+# ("fri 12:00"), plus the last fire time of each scheduled job.
+GROUPS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS groups (
+        chat_id INTEGER PRIMARY KEY,
+        timezone TEXT NOT NULL,
+        signup_at TEXT NOT NULL,
+        summary_at TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS schedule_state (
+        chat_id INTEGER NOT NULL,
+        job TEXT NOT NULL,
+        last_fire REAL NOT NULL,
+        PRIMARY KEY (chat_id, job)
+    ) WITHOUT ROWID;
+'''
+
+# Finished weeks, moved out of signups by the weekly archive, and running
+# totals kept up to date by the same step so stats never scan the history.
+# `day` in signup_history is the index into roster.DAYS (a bitmask, `days`,
+# from v8 on).
+HISTORY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS signup_history (
+        chat_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, week_start, user_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS week_totals (
+        chat_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        monday INTEGER NOT NULL, tuesday INTEGER NOT NULL, wednesday INTEGER NOT NULL,
+        thursday INTEGER NOT NULL, unavailable INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, week_start)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS user_totals (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        user_name TEXT,
+        weeks INTEGER NOT NULL,
+        monday INTEGER NOT NULL, tuesday INTEGER NOT NULL, wednesday INTEGER NOT NULL,
+        thursday INTEGER NOT NULL, unavailable INTEGER NOT NULL,
+        last_week TEXT NOT NULL,
+        PRIMARY KEY (chat_id, user_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS group_totals (
+        chat_id INTEGER PRIMARY KEY,
+        weeks INTEGER NOT NULL,
+        monday INTEGER NOT NULL, tuesday INTEGER NOT NULL, wednesday INTEGER NOT NULL,
+        thursday INTEGER NOT NULL, unavailable INTEGER NOT NULL,
+        first_week TEXT NOT NULL,
+        last_week TEXT NOT NULL
+    );
+'''
+
+# Signup messages posted for a group's week; every roster change is pushed
+# to all of them.
+LIVE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS live_messages (
+        chat_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        message_id INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, week_start, message_id)
+    ) WITHOUT ROWID;
+'''
+
+# Full-text index over the archived weeks, kept by the weekly archive (see
+# search.py for what goes in each column).
+SEARCH_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS schedule_fts USING fts5 (
+        chat, week, day, names, chat_id UNINDEXED, week_start UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE INDEX IF NOT EXISTS user_totals_by_user ON user_totals (user_id);
+'''
+
+
+# v8: a member can pick several days. `days` is a bitmask over roster.DAYS,
+# bit i = DAYS[i], in both the live and the archived rows.
+DAYS_SCHEMA = '''
+    CREATE TABLE signups (
+        chat_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        user_name TEXT,
+        days INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, week_start, user_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE signup_history (
+        chat_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        days INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, week_start, user_id)
+    ) WITHOUT ROWID;
+'''
+
+
+def _create(conn, script):
+    # executescript() would commit mid-migration, so run statements one by one.
+    for stmt in script.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+
+
+def _is_legacy(conn):
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(signups)")]
+    return bool(cols) and "chat_id" not in cols
+
+
+# -------------------- MIGRATIONS --------------------
+def _v1_partition_signups(conn, legacy_chat_id, week_start):
+    if not _is_legacy(conn):
+        _create(conn, SCHEMA)
+        return
+    # Single-group table keyed by user_id only: adopt its rows into the
+    # configured group's current week.
+    logger.info("Migrating legacy signups table to chat %s, week %s",
+                legacy_chat_id, week_start)
+    conn.execute("ALTER TABLE signups RENAME TO signups_legacy")
+    _create(conn, SCHEMA)
+    conn.execute(
+        "INSERT INTO signups (chat_id, week_start, user_id, user_name, day) "
+        "SELECT ?, ?, user_id, user_name, day FROM signups_legacy",
+        (legacy_chat_id, week_start))
+    conn.execute("DROP TABLE signups_legacy")
+
+
+def _v2_groups(conn, legacy_chat_id, week_start):
+    _create(conn, GROUPS_SCHEMA)
+
+
+def _v3_history(conn, legacy_chat_id, week_start):
+    # Weeks already in signups are archived by the next summary run.
+    _create(conn, HISTORY_SCHEMA)
+
+
+def _v4_live_messages(conn, legacy_chat_id, week_start):
+    _create(conn, LIVE_SCHEMA)
+
+
+def _v5_reminders(conn, legacy_chat_id, week_start):
+    # Per-group "unfilled days" reminder: weekly slot (NULL = the default,
+    # 'off' = none), local quiet hours, and the week last reminded about.
+    for column in ("remind_at TEXT", "quiet_start INTEGER", "quiet_end INTEGER",
+                   "reminded_week TEXT"):
+        conn.execute(f"ALTER TABLE groups ADD COLUMN {column}")
+
+
+def _v6_day_capacity(conn, legacy_chat_id, week_start):
+    # People per study day; NULL = the configured default, 0 = no limit.
+    conn.execute("ALTER TABLE groups ADD COLUMN day_capacity INTEGER")
+
+
+def _v7_search(conn, legacy_chat_id, week_start):
+    from roster import DAYS
+    from search import register
+
+    _create(conn, SEARCH_SCHEMA)
+    # Index what's already archived; names there are each member's latest.
+    register(conn)
+    day_name = "CASE h.day " + " ".join(f"WHEN {i} THEN '{day}'" for i, day in enumerate(DAYS))
+    conn.execute(
+        "INSERT INTO schedule_fts (chat, week, day, names, chat_id, week_start) "
+        f"SELECT chat_token(h.chat_id), week_words(h.week_start), {day_name} END, "
+        "       group_concat(u.user_name, ', '), h.chat_id, h.week_start "
+        "FROM signup_history h LEFT JOIN user_totals u USING (chat_id, user_id) "
+        "WHERE h.day >= 0 GROUP BY h.chat_id, h.week_start, h.day")
+
+
+def _v8_day_bitmask(conn, legacy_chat_id, week_start):
+    from roster import DAYS
+
+    # Rebuilt rather than altered: the old day column is in signups_by_day,
+    # which a per-user bitmask has no use for.
+    for table in ("signups", "signup_history"):
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v7")
+    _create(conn, DAYS_SCHEMA)
+    day_bit = "CASE day " + " ".join(f"WHEN '{day}' THEN {1 << i}" for i, day in enumerate(DAYS))
+    conn.execute(
+        "INSERT INTO signups (chat_id, week_start, user_id, user_name, days) "
+        f"SELECT chat_id, week_start, user_id, user_name, {day_bit} END "
+        f"FROM signups_v7 WHERE day IN ({', '.join(repr(day) for day in DAYS)})")
+    conn.execute(
+        "INSERT INTO signup_history (chat_id, week_start, user_id, days) "
+        "SELECT chat_id, week_start, user_id, CASE WHEN day >= 0 THEN 1 << day ELSE 0 END "
+        "FROM signup_history_v7")
+    for table in ("signups", "signup_history"):
+        conn.execute(f"DROP TABLE {table}_v7")
+
+
+MIGRATIONS = [_v1_partition_signups, _v2_groups, _v3_history, _v4_live_messages,
+              _v5_reminders, _v6_day_capacity, _v7_search, _v8_day_bitmask]
+
+
+def _begin_immediate(conn):
+    # Takes the write lock now rather than at the first write. A step another
+    # process is running can outlast busy_timeout, so keep waiting.
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            time.sleep(0.1)
+
+
+def migrate(conn, legacy_chat_id: int, week_start: str):
+    """Bring the database up to date. Runs on the storage thread.
+
+    Every webhook worker migrates the same file at startup, so each step
+    re-reads the version under the write lock: a step another process has
+    already applied is never run twice.
+    """
+    while True:
+        _begin_immediate(conn)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.rollback()
+                return
+            MIGRATIONS[version](conn, legacy_chat_id, week_start)
+            conn.execute(f"PRAGMA user_version={version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Database schema at version %s", version + 1)
@@ -0,0 +1,100 @@
+import re
+from datetime import date, timedelta
+
+from roster import DAY_LINES
+
+PAGE_SIZE = 8
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august",
+          "september", "october", "november", "december"]
+
+
+# -------------------- INDEXED TEXT --------------------
+# schedule_fts holds one row per archived (group, week, day): the names on
+# that day, the day, and searchable words for the week. The group is an
+# indexed token too, so a group filter is a posting-list intersection
+# rather than a scan over every group's matches.
+def chat_token(chat_id: int) -> str:
+    return f"g{'n' if chat_id < 0 else 'p'}{abs(chat_id)}"
+
+
+def easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _holidays(year: int):
+    thanksgiving = date(year, 11, 1) + timedelta(days=(3 - date(year, 11, 1).weekday()) % 7 + 21)
+    yield easter(year), "easter"
+    yield easter(year) - timedelta(days=2), "good friday"
+    yield thanksgiving, "thanksgiving"
+    yield date(year, 12, 25), "christmas"
+    yield date(year, 1, 1), "new year"
+
+
+def week_words(week_start: str) -> str:
+    """Date, month, year and holiday words for the Monday-to-Sunday week."""
+    monday = date.fromisoformat(week_start)
+    days = [monday + timedelta(days=i) for i in range(7)]
+    words = [week_start]
+    for day in days:
+        for word in (MONTHS[day.month - 1], str(day.year)):
+            if word not in words:
+                words.append(word)
+    for year in {day.year for day in days}:
+        words += [name for when, name in _holidays(year) if monday <= when <= days[-1]]
+    return " ".join(words)
+
+
+def register(conn):
+    """Make chat_token() and week_words() callable from SQL on this connection."""
+    conn.create_function("chat_token", 1, chat_token, deterministic=True)
+    conn.create_function("week_words", 1, week_words, deterministic=True)
+
+
+# -------------------- QUERIES --------------------
+def fts_query(text: str):
+    """User text -> FTS5 query: every word must match, as a prefix."""
+    terms = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+async def search(storage, chat_ids, text: str, offset: int = 0, limit: int = PAGE_SIZE):
+    """One page of (chat_id, week_start, day, names), newest week first, and
+    whether there are more."""
+    query = fts_query(text)
+    if not query or not chat_ids:
+        return [], False
+    chats = " OR ".join(chat_token(chat_id) for chat_id in chat_ids)
+    rows = await storage.fetchall(
+        "SELECT chat_id, week_start, day, names FROM schedule_fts "
+        "WHERE schedule_fts MATCH ? ORDER BY week_start DESC, chat_id LIMIT ? OFFSET ?",
+        (f"chat : ({chats}) AND ({query})", limit + 1, offset))
+    return rows[:limit], len(rows) > limit
+
+
+async def member_groups(storage, user_id: int):
+    """Groups whose archived weeks a user appears in."""
+    rows = await storage.fetchall("SELECT chat_id FROM user_totals WHERE user_id=?", (user_id,))
+    return [chat_id for chat_id, in rows]
+
+
+def render_row(week_start: str, day: str, names: str) -> str:
+    return f"{week_start}  " + DAY_LINES[day].format(names).strip()
+
+
+def render_results(text: str, rows, offset: int) -> str:
+    # Plain text: names and the query are shown verbatim.
+    if not rows:
+        return f"🔎 No past weeks match “{text}”." if not offset else "🔎 No more results."
+    lines = [f"🔎 “{text}”: results {offset + 1}–{offset + len(rows)}", ""]
+    lines += [render_row(week_start, day, names) for _, week_start, day, names in rows]
+    return "\n".join(lines)
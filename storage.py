@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------- STORAGE --------------------
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class Storage:
+    """One long-lived WAL-mode SQLite connection owned by a dedicated thread.
+
+    Every statement is shipped to that thread, so the event loop never waits
+    on disk I/O and statements are naturally serialized.
+
+    Signup mutations go through write(), which group-commits: writes queued
+    while a commit is running, within the same loop tick, or within an
+    optional extra `flush_interval` window (up to `flush_max` of them) are
+    applied in one transaction, and each caller resumes once its write is
+    committed and fsynced (synchronous=FULL). Writes that ask for their
+    rowcount (conditional writes) are executed one by one inside the batch
+    instead of through executemany.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.0, flush_max: int = 256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_max = flush_max
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = None
+        self._warmup = None
+        self._pending = []          # (sql, params, rowcount, future, enqueued_at)
+        self._timer = None
+        self._flush_task = None
+        self._flushing = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        # busy_timeout first: switching a fresh file to WAL can meet another
+        # worker doing the same.
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: every commit is fsynced, so a resumed write survives power
+        # loss. Group commit makes that one fsync per batch, not per write.
+        conn.execute("PRAGMA synchronous=FULL")
+        self._conn = conn
+
+    async def run(self, fn, *args):
+        """Run fn(conn, *args) on the storage thread and return its result."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, fn, args)
+        finally:
+            metrics.histogram("db_seconds", op=fn.__name__.strip("_")).observe(
+                time.perf_counter() - start)
+
+    def _call(self, fn, args):
+        if self._conn is None:
+            self._open()
+        return fn(self._conn, *args)
+
+    async def open(self):
+        def _open(conn):
+            pass
+        await self.run(_open)
+
+    def warm_up(self, fn, *args):
+        """Start fn(conn, *args) on the storage thread now; no event loop needed.
+
+        Later calls queue behind it on the same thread; ready() waits for it
+        and re-raises its error.
+        """
+        self._warmup = self._executor.submit(self._call, fn, args)
+
+    async def ready(self):
+        if self._warmup is not None:
+            await asyncio.wrap_future(self._warmup)
+
+    async def execute(self, sql: str, params=()):
+        def _execute(conn):
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur.rowcount
+        return await self.run(_execute)
+
+    # ---------- group commit ----------
+    async def write(self, sql: str, params=(), rowcount: bool = False):
+        """Queue a write for the next group commit and wait until it is durable.
+
+        With `rowcount`, return the number of rows the statement changed.
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((sql, params, rowcount, fut, time.perf_counter()))
+        if len(self._pending) >= self.flush_max:
+            self._flush_soon(0)
+        elif self._timer is None:
+            self._flush_soon(self.flush_interval)
+        return await fut
+
+    def _flush_soon(self, delay):
+        if self._flushing:
+            return      # the running flush picks up what's pending when it finishes
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        self._timer = None
+        if self._flushing or not self._pending:
+            return
+        self._flushing = True
+        batch, self._pending = self._pending[:self.flush_max], self._pending[self.flush_max:]
+        try:
+            results = await self.run(_commit_batch, [op[:3] for op in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self._flushing = False
+
+        metrics.histogram("db_batch_size", BATCH_BUCKETS).observe(len(batch))
+        commit_wait = metrics.histogram("db_commit_wait_seconds")
+        now = time.perf_counter()
+        for (_, _, _, fut, enqueued), result in zip(batch, results):
+            commit_wait.observe(now - enqueued)
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+        # Whatever queued up during this commit goes out right away.
+        if self._pending:
+            self._flush_soon(0)
+
+    async def fetchall(self, sql: str, params=()):
+        def _fetchall(conn):
+            return conn.execute(sql, params).fetchall()
+        return await self.run(_fetchall)
+
+    async def close(self):
+        while self._pending or self._flushing:
+            await self._flush()
+            await asyncio.sleep(0.001)
+        def _close(conn):
+            if conn is not None:
+                conn.close()
+            self._conn = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, _close, self._conn)
+        self._executor.shutdown(wait=True)
+        logger.info("Storage closed")
+
+
+def _commit_batch(conn, ops):
+    """Apply (sql, params, rowcount) ops in one transaction.
+
+    Returns, per op, its rowcount if asked for, else None, or the exception
+    it raised. Runs of the same statement go through executemany unless
+    they need their rowcount. If the batch fails, each op is retried in its
+    own transaction so one bad write can't sink the others.
+    """
+    try:
+        conn.execute("BEGIN")
+        results = [None] * len(ops)
+        i = 0
+        while i < len(ops):
+            sql, _, counted = ops[i]
+            if counted:
+                results[i] = conn.execute(sql, ops[i][1]).rowcount
+                i += 1
+                continue
+            j = i
+            while j < len(ops) and ops[j][0] == sql and not ops[j][2]:
+                j += 1
+            conn.executemany(sql, [params for _, params, _ in ops[i:j]])
+            i = j
+        conn.commit()
+        return results
+    except sqlite3.Error:
+        conn.rollback()
+
+    results = []
+    for sql, params, counted in ops:
+        try:
+            with conn:
+                rows = conn.execute(sql, params).rowcount
+            results.append(rows if counted else None)
+        except sqlite3.Error as e:
+            results.append(e)
+    return results
@@ -0,0 +1,293 @@
+"""Bulk export and import of signups, for moving groups between instances.
+
+    python transfer.py export --chat -100123 -o group.csv
+    python transfer.py import group.csv --db other.db
+    python transfer.py import-take1 signups.json --chat -100123
+
+Files are CSV or JSONL (by extension, or --format), one signup per row:
+chat_id, week_start (the study week's Monday), user_id, user_name, days.
+`days` is written as day names ("Monday+Thursday" in CSV, a list in JSONL)
+and read as names or as the bitmask itself. Both directions stream, so
+memory stays flat whatever the file size.
+
+The database is migrated first, so this also brings an offline copy up to
+date. Against a running bot's WAL database an export is one read snapshot
+and never blocks writers; an import commits every --batch rows in its own
+short transaction and pauses between them so the bot's writes get the
+lock. A running bot serves the current week from memory: send it SIGHUP
+(every worker) to pick up imported rows for that week.
+
+import-take1 reads the `signups` dict of Take 1/bible_study_bot.py,
+{"Monday": ["Sarah", ...], ...}, as JSON or as the printed dict. Those
+signups carry only first names, so each name gets a stable negative
+user_id, which never collides with a Telegram user.
+"""
+import argparse
+import ast
+import csv
+import json
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import date, datetime
+
+import pytz
+
+from config import DB_PATH, GROUP_CHAT_ID, TIMEZONE
+from roster import DAY_BITS, STUDY_MASK, UNAVAILABLE, day_names
+from schema import migrate, week_start_for
+
+FIELDS = ["chat_id", "week_start", "user_id", "user_name", "days"]
+
+UPSERT_SQL = (
+    "INSERT INTO signups (chat_id, week_start, user_id, user_name, days) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (chat_id, week_start, user_id) DO UPDATE SET "
+    "user_name = excluded.user_name, days = {days}"
+)
+
+
+def connect(path: str):
+    conn = sqlite3.connect(path, isolation_level=None)
+    # busy_timeout first: against the live database, even the switch to WAL
+    # can meet a bot write.
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA journal_mode=WAL")
+    migrate(conn, GROUP_CHAT_ID, current_week())
+    return conn
+
+
+def current_week() -> str:
+    return week_start_for(datetime.now(pytz.timezone(TIMEZONE)))
+
+
+def file_format(path: str, given: str = None) -> str:
+    if given:
+        return given
+    return "jsonl" if path.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+class Progress:
+    """Row count and rate on stderr, redrawn at most every half second."""
+
+    def __init__(self, verb: str, quiet: bool = False):
+        self.verb = verb
+        self.quiet = quiet
+        self.rows = 0
+        self._start = self._shown = time.monotonic()
+
+    def add(self, rows: int):
+        self.rows += rows
+        now = time.monotonic()
+        if not self.quiet and now - self._shown >= 0.5:
+            self._shown = now
+            self._show(now)
+
+    def done(self):
+        if not self.quiet:
+            self._show(time.monotonic())
+            print(file=sys.stderr)
+
+    def _show(self, now):
+        rate = self.rows / max(now - self._start, 1e-9)
+        print(f"\r{self.verb} {self.rows:,} rows ({rate:,.0f}/s)", end="", file=sys.stderr)
+
+
+# -------------------- EXPORT --------------------
+def export(conn, out, fmt: str, chat_id: int = None, week_start: str = None,
+           progress: Progress = None):
+    where, params = [], []
+    for column, value in (("chat_id", chat_id), ("week_start", week_start)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    rows = conn.execute(
+        f"SELECT {', '.join(FIELDS)} FROM signups "
+        f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+        f"ORDER BY chat_id, week_start, user_id", params)
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer:
+        writer.writerow(FIELDS)
+    # The cursor steps through the table: one row in memory at a time.
+    for chat, week, user_id, user_name, days in rows:
+        if writer:
+            writer.writerow([chat, week, user_id, user_name, "+".join(day_names(days))])
+        else:
+            out.write(json.dumps({"chat_id": chat, "week_start": week, "user_id": user_id,
+                                  "user_name": user_name, "days": day_names(days)},
+                                 ensure_ascii=False) + "\n")
+        if progress:
+            progress.add(1)
+
+
+# -------------------- IMPORT --------------------
+def parse_days(value) -> int:
+    """Day names ("Monday+Thursday", ["Monday", ...]) or a bitmask -> bitmask."""
+    if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+        mask = int(value)
+    else:
+        if isinstance(value, str):
+            names = value.replace(",", "+").split("+")
+        elif isinstance(value, list) and all(isinstance(name, str) for name in value):
+            names = value
+        else:       # a missing CSV cell (None), a list of numbers, ...
+            raise ValueError(f"bad days {value!r}")
+        mask = 0
+        for name in names:
+            name = name.strip().capitalize()
+            if name not in DAY_BITS:
+                raise ValueError(f"unknown day {name!r}")
+            mask |= DAY_BITS[name]
+    if not mask or mask & ~(STUDY_MASK | UNAVAILABLE):
+        raise ValueError(f"bad days {value!r}")
+    if mask & UNAVAILABLE and mask & STUDY_MASK:
+        raise ValueError(f"days {value!r} mix study days with Unavailable")
+    return mask
+
+
+def parse_row(record):
+    if isinstance(record, str):
+        record = json.loads(record)         # a JSONL line
+    week_start = str(record["week_start"])
+    if date.fromisoformat(week_start).weekday() != 0:
+        raise ValueError(f"week_start {week_start} is not a Monday")
+    return (int(record["chat_id"]), week_start, int(record["user_id"]),
+            record.get("user_name") or None, parse_days(record["days"]))
+
+
+def read_rows(f, fmt: str):
+    """Yield (line number, record) from a CSV or JSONL stream; JSONL records
+    are decoded by parse_row, so a bad line is reported like a bad value."""
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_num, line in enumerate(f, 1):
+            if line.strip():
+                yield line_num, line
+
+
+def import_rows(conn, records, batch: int = 2000, merge: bool = False, pause: float = 0.01,
+                progress: Progress = None) -> int:
+    """Upsert (line number, record) pairs in transactions of `batch` rows.
+
+    A row replaces the member's days for that week, or with `merge` adds to
+    them. Stops at the first bad row; batches before it stay committed.
+    """
+    # Merged, the result still never mixes study days with Unavailable.
+    merged = (f"CASE WHEN excluded.days & {UNAVAILABLE} THEN excluded.days "
+              f"ELSE (days & {STUDY_MASK}) | excluded.days END")
+    sql = UPSERT_SQL.format(days=merged if merge else "excluded.days")
+    rows, imported = [], 0
+
+    def flush():
+        nonlocal imported
+        # IMMEDIATE takes the write lock up front; the transaction lasts one
+        # executemany, and the pause lets a waiting bot write go first.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        imported += len(rows)
+        if progress:
+            progress.add(len(rows))
+        rows.clear()
+        time.sleep(pause)
+
+    for line_num, record in records:
+        try:
+            rows.append(parse_row(record))
+        except (KeyError, TypeError, ValueError) as e:
+            if rows:
+                flush()
+            raise ValueError(f"line {line_num}: {e!r}; {imported:,} rows imported before it")
+        if len(rows) >= batch:
+            flush()
+    if rows:
+        flush()
+    return imported
+
+
+def take1_records(text: str, chat_id: int, week_start: str):
+    """Records from Take 1's {day: [first names]} dict, one per name."""
+    try:
+        signups = json.loads(text)
+    except json.JSONDecodeError:
+        signups = ast.literal_eval(text)
+    days = {}
+    for day, names in signups.items():
+        for name in names:
+            days.setdefault(name, []).append(day)
+    for line_num, (name, picked) in enumerate(days.items(), 1):
+        user_id = -1 - zlib.crc32(name.encode())
+        yield line_num, {"chat_id": chat_id, "week_start": week_start, "user_id": user_id,
+                         "user_name": name, "days": picked}
+
+
+# -------------------- CLI --------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=DB_PATH, help="SQLite database (default: DB_PATH)")
+    common.add_argument("--quiet", action="store_true", help="no progress on stderr")
+
+    out = sub.add_parser("export", parents=[common], help="write signups to CSV/JSONL")
+    out.add_argument("-o", "--out", default="-", help="output file, - = stdout")
+    out.add_argument("--format", choices=("csv", "jsonl"))
+    out.add_argument("--chat", type=int, help="only this group")
+    out.add_argument("--week", help="only this week (its Monday, YYYY-MM-DD)")
+
+    for name, help_text in (("import", "upsert signups from CSV/JSONL"),
+                            ("import-take1", "import Take 1's in-memory signups dict")):
+        cmd = sub.add_parser(name, parents=[common], help=help_text)
+        cmd.add_argument("file", help="input file, - = stdin")
+        cmd.add_argument("--batch", type=int, default=2000, help="rows per transaction")
+        cmd.add_argument("--pause", type=float, default=0.01,
+                         help="seconds between transactions, for the bot's writes")
+        cmd.add_argument("--merge", action="store_true",
+                         help="add to a member's days instead of replacing them")
+    sub.choices["import"].add_argument("--format", choices=("csv", "jsonl"))
+    take1 = sub.choices["import-take1"]
+    take1.add_argument("--chat", type=int, default=GROUP_CHAT_ID or None,
+                       required=not GROUP_CHAT_ID, help="group (default: GROUP_CHAT_ID)")
+    take1.add_argument("--week", help="study week's Monday (default: the current week)")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "export":
+        fmt = file_format(args.out, args.format)
+        progress = Progress("exported", args.quiet or args.out == "-")
+        f = sys.stdout if args.out == "-" else open(args.out, "w", newline="", encoding="utf-8")
+        try:
+            export(conn, f, fmt, args.chat, args.week, progress)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        progress.done()
+        return
+
+    progress = Progress("imported", args.quiet)
+    f = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    try:
+        if args.command == "import":
+            records = read_rows(f, file_format(args.file, args.format))
+        else:
+            records = take1_records(f.read(), args.chat, args.week or current_week())
+        import_rows(conn, records, args.batch, args.merge, args.pause, progress)
+    except ValueError as e:
+        progress.done()
+        sys.exit(f"import stopped at {e}")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    progress.done()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import sys
+import urllib.parse
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------- SHARDING --------------------
+def update_chat_id(data: dict):
+    """Chat an update belongs to, read straight from the raw update JSON."""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post",
+                "my_chat_member", "chat_member", "chat_join_request"):
+        if key in data:
+            return data[key]["chat"]["id"]
+    if "callback_query" in data:
+        query = data["callback_query"]
+        if "message" in query:
+            return query["message"]["chat"]["id"]
+        return query["from"]["id"]
+    for key in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query"):
+        if key in data:
+            return data[key]["from"]["id"]
+    return 0
+
+
+def shard_of(chat_id: int, workers: int) -> int:
+    # Plain modulo of the integer id: stable across processes and restarts,
+    # unlike hash() on str.
+    return chat_id % workers
+
+
+# -------------------- WORKERS --------------------
+async def _serve_queue(build_app, worker, workers, queue):
+    from telegram import Update
+
+    app = build_app(worker, workers)
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    logger.info("Webhook worker %s/%s ready", worker + 1, workers)
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            await app.update_queue.put(Update.de_json(json.loads(raw), app.bot))
+    finally:
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def _worker_main(build_app, worker, workers, queue):
+    # The front process handles SIGINT/SIGTERM and stops us with a sentinel.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_queue(build_app, worker, workers, queue))
+
+
+# -------------------- HTTP FRONT END --------------------
+class WebhookServer:
+    """Minimal HTTP server receiving Telegram webhook POSTs.
+
+    Each update is routed to worker `chat_id % workers`, so all updates of a
+    chat are handled, in order, by the same process.
+    """
+
+    def __init__(self, build_app, workers=1, path="/webhook", secret=None):
+        self.build_app = build_app
+        self.workers = workers
+        self.path = path
+        self.secret = secret
+        self._queues = []
+        self._procs = []
+        self.failed = False
+
+    def start_workers(self):
+        for worker in range(self.workers):
+            queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(
+                target=_worker_main, args=(self.build_app, worker, self.workers, queue),
+                name=f"bot-worker-{worker}", daemon=True)
+            proc.start()
+            self._queues.append(queue)
+            self._procs.append(proc)
+
+    def stop_workers(self):
+        for queue in self._queues:
+            queue.put(None)
+        for proc in self._procs:
+            proc.join(timeout=10)
+
+    async def _watch_workers(self, stop):
+        # A worker that exits (e.g. its startup failed) would leave its chats
+        # unanswered; stop everything so the supervisor restarts the service.
+        while not stop.is_set():
+            dead = [proc.name for proc in self._procs if not proc.is_alive()]
+            if dead:
+                logger.critical("%s exited, shutting down", ", ".join(dead))
+                self.failed = True
+                stop.set()
+            await asyncio.sleep(1)
+
+    async def _handle(self, reader, writer):
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            status = self._route(method, path, headers, body)
+        except (ValueError, KeyError, TypeError, AttributeError, asyncio.IncompleteReadError):
+            status = "400 Bad Request"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                     .encode())
+        await writer.drain()
+        writer.close()
+
+    def _route(self, method, path, headers, body):
+        if path != self.path:
+            return "404 Not Found"
+        if method != "POST":
+            return "405 Method Not Allowed"
+        if self.secret and headers.get("x-telegram-bot-api-secret-token") != self.secret:
+            return "403 Forbidden"
+        data = json.loads(body)
+        if not isinstance(data, dict):
+            raise ValueError("update is not a JSON object")
+        chat_id = update_chat_id(data)
+        self._queues[shard_of(chat_id, self.workers)].put(body)
+        return "200 OK"
+
+    def set_webhook(self, webhook_url, token, api_url=None):
+        # Plain urllib: the front end never imports telegram/httpx.
+        params = {"url": webhook_url + self.path}
+        if self.secret:
+            params["secret_token"] = self.secret
+        request = urllib.request.Request(
+            f"{api_url or 'https://api.telegram.org/bot'}{token}/setWebhook",
+            data=urllib.parse.urlencode(params).encode())
+        with urllib.request.urlopen(request, timeout=30) as response:
+            result = json.load(response)
+        if not result.get("ok"):
+            raise RuntimeError(f"setWebhook failed: {result}")
+        logger.info("Webhook registered at %s%s", webhook_url, self.path)
+
+    async def serve(self, listen, port, webhook_url=None, token=None, api_url=None):
+        if webhook_url:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.set_webhook, webhook_url, token, api_url)
+
+        server = await asyncio.start_server(self._handle, listen, port)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info("Listening for webhook updates on %s:%s (%s workers)",
+                    listen, port, self.workers)
+        watcher = asyncio.create_task(self._watch_workers(stop))
+        async with server:
+            await stop.wait()
+        watcher.cancel()
+
+
+def run_webhook(build_app, workers, listen, port, path="/webhook", secret=None,
+                webhook_url=None, token=None, api_url=None):
+    server = WebhookServer(build_app, workers, path, secret)
+    server.start_workers()
+    try:
+        asyncio.run(server.serve(listen, port, webhook_url, token, api_url))
+    finally:
+        server.stop_workers()
+    if server.failed:
+        sys.exit(1)